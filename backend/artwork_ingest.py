@@ -0,0 +1,70 @@
+# backend/artwork_ingest.py
+import io
+from PIL import Image
+
+from backend.supabase_client import supabase
+from backend.print_config import ARTWORK_PREVIEW_MAX_SIDE
+from backend.print_utils import fetch_print_bytes, trim_transparent
+from backend.render_cache import content_hash
+from backend.storage_uploader import BulkUploader
+
+PRINTS_BUCKET = "prints"
+
+
+def _encode_png(img: Image.Image) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def normalize_artwork(data: bytes) -> dict:
+    """
+    Decodifica o upload uma unica vez, recorta a transparencia e gera
+    o PNG canonico (ja trimado) + derivado pequeno para preview.
+    """
+    img = trim_transparent(Image.open(io.BytesIO(data)).convert("RGBA"))
+
+    canonical = _encode_png(img)
+
+    thumb = img.copy()
+    thumb.thumbnail((ARTWORK_PREVIEW_MAX_SIDE, ARTWORK_PREVIEW_MAX_SIDE), Image.LANCZOS)
+
+    return {
+        "canonical": canonical,
+        "preview": _encode_png(thumb),
+        "pixel_width": img.width,
+        "pixel_height": img.height,
+        "content_hash": content_hash(canonical),
+    }
+
+
+def ingest_print_slot(print_id: str, slot_type: str, user_id: str, original_url: str):
+    """
+    Job de ingestao (roda no worker): grava o PNG canonico em caminho
+    enderecado por conteudo e atualiza o print_slot para os renders
+    usarem a arte ja trimada.
+    """
+    print(f"🧼 Normalizando arte {print_id}/{slot_type}")
+
+    result = normalize_artwork(fetch_print_bytes(original_url))
+    digest = result["content_hash"]
+
+    base = f"{user_id}/{print_id}/{slot_type}-{digest[:16]}"
+
+    # canonico e preview sobem em paralelo
+    with BulkUploader(concurrency=2) as uploader:
+        canonical = uploader.upload(PRINTS_BUCKET, f"{base}.png", result["canonical"], "image/png")
+        preview = uploader.upload(PRINTS_BUCKET, f"{base}.preview.png", result["preview"], "image/png")
+        uploader.wait()
+
+    supabase.table("print_slots").update({
+        "url": canonical.result(),
+        "original_url": original_url,
+        "preview_url": preview.result(),
+        "pixel_width": result["pixel_width"],
+        "pixel_height": result["pixel_height"],
+        "content_hash": digest,
+        "trimmed": True,
+    }).eq("print_id", print_id).eq("type", slot_type).eq("url", original_url).execute()
+
+    print(f"✅ Arte {print_id}/{slot_type} normalizada ({result['pixel_width']}x{result['pixel_height']})")
@@ -0,0 +1,112 @@
+# backend/artwork_store.py
+#
+# Arte ja decodificada (RGBA, ja trimada) em arquivo bruto no disco local,
+# aberta via mmap + Image.frombuffer: sem decode de PNG e sem copia. Como o
+# mapeamento e compartilhado, varios workers no mesmo host usam as mesmas
+# paginas do page cache.
+#
+# Arquivo: cabecalho de 16 bytes (magic + largura + altura) + pixels RGBA.
+# Nome: {content_hash}-t{TRIM_ALPHA_THRESHOLD}.rgba (o trim faz parte do
+# resultado). ARTWORK_STORE_DIR="" desliga.
+
+import os
+import mmap
+import struct
+import threading
+from PIL import Image
+
+from backend.print_config import TRIM_ALPHA_THRESHOLD
+
+ARTWORK_STORE_DIR = os.getenv("ARTWORK_STORE_DIR", "/tmp/pvty-artwork")
+ARTWORK_STORE_MAX_BYTES = int(os.getenv("ARTWORK_STORE_MAX_MB", "4096")) * 1024 * 1024
+ARTWORK_STORE_ENABLED = bool(ARTWORK_STORE_DIR)
+
+_MAGIC = b"PVTYRGBA"
+_HEADER = struct.Struct(">8sII")
+_WRITE_ROWS = 256
+
+
+def _path(digest: str) -> str:
+    return os.path.join(ARTWORK_STORE_DIR, f"{digest}-t{TRIM_ALPHA_THRESHOLD}.rgba")
+
+
+def open_artwork(digest: str) -> Image.Image | None:
+    """
+    Imagem somente-leitura apontando direto para o arquivo mapeado.
+    Quem precisar alterar os pixels deve copiar antes (o Pillow copia
+    sozinho ao escrever numa imagem readonly).
+    """
+    if not ARTWORK_STORE_ENABLED:
+        return None
+
+    path = _path(digest)
+    try:
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):
+        return None
+
+    magic, w, h = _HEADER.unpack_from(mm) if len(mm) >= _HEADER.size else (None, 0, 0)
+    if magic != _MAGIC or len(mm) != _HEADER.size + w * h * 4:
+        mm.close()
+        return None
+
+    # marca uso recente para a eviccao
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+    pixels = memoryview(mm)[_HEADER.size:]
+    return Image.frombuffer("RGBA", (w, h), pixels, "raw", "RGBA", 0, 1)
+
+
+def save_artwork(digest: str, img: Image.Image):
+    """Grava os pixels em blocos de linhas (sem tobytes() da imagem inteira)."""
+    if not ARTWORK_STORE_ENABLED:
+        return
+
+    if img.mode != "RGBA":
+        img = img.convert("RGBA")
+
+    os.makedirs(ARTWORK_STORE_DIR, exist_ok=True)
+    path = _path(digest)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    w, h = img.size
+    try:
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, w, h))
+            for y in range(0, h, _WRITE_ROWS):
+                f.write(img.crop((0, y, w, min(h, y + _WRITE_ROWS))).tobytes())
+        # rename atomico: outro worker nunca ve arquivo pela metade
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"⚠️ Falha ao gravar arte {digest[:12]} no store local: {e}")
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        return
+
+    _evict()
+
+
+def _evict():
+    """Apaga os arquivos menos usados quando o diretorio passa do limite."""
+    try:
+        entries = [e for e in os.scandir(ARTWORK_STORE_DIR) if e.name.endswith(".rgba")]
+    except OSError:
+        return
+
+    stats = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in entries]
+    total = sum(size for _, size, _ in stats)
+    for _, size, path in sorted(stats):
+        if total <= ARTWORK_STORE_MAX_BYTES:
+            break
+        # quem ja mapeou o arquivo continua lendo normalmente apos o unlink
+        try:
+            os.unlink(path)
+            total -= size
+        except OSError:
+            continue
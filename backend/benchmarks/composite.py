@@ -0,0 +1,110 @@
+# backend/benchmarks/composite.py
+#
+# Montagem de uma folha a partir de artes ja decodificadas: loop antigo
+# (copy + resize + rotate por item) vs arte compartilhada somente-leitura
+# com fit_artwork uma vez por (arte, tamanho, rotacao).
+#
+# Mede imagens alocadas pelo Pillow (Image.core.get_stats) e o pico de RSS
+# de cada variante num processo novo.
+#
+#   python -m backend.benchmarks.composite [--kits 8]
+
+import os
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9/")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "benchmark")
+os.environ.setdefault("ENV", "production")
+
+import argparse
+import multiprocessing
+import resource
+import time
+from collections import Counter
+from PIL import Image
+
+from backend.benchmarks.render import ART_SETS, synthetic_artwork
+from backend.print_utils import cm_to_px, trim_transparent
+from backend.packing import pack_items_hybrid
+from backend.render_engine import fit_artwork, resize_to_slot
+
+
+def legacy_sheet(sheet, size, arts):
+    img = Image.new("RGBA", size, (255, 255, 255, 0))
+    for item in sheet.items:
+        art = arts[item["print_url"]].copy()
+        art = resize_to_slot(art, item["w"], item["h"])
+        if item.get("rotated"):
+            art = art.rotate(90, expand=True)
+        img.alpha_composite(art, dest=(item["x"], item["y"]))
+    return img
+
+
+def fit_key(item) -> tuple:
+    return (item["print_url"], item["w"], item["h"], bool(item.get("rotated")))
+
+
+def shared_sheet(sheet, size, arts, fitted, uses_left):
+    img = Image.new("RGBA", size, (255, 255, 255, 0))
+    for item in sheet.items:
+        key = fit_key(item)
+        if key not in fitted:
+            fitted[key] = fit_artwork(arts[item["print_url"]], *key[1:])
+        img.alpha_composite(fitted[key], dest=(item["x"], item["y"]))
+        uses_left[key] -= 1
+        if uses_left[key] == 0:
+            del fitted[key]
+    return img
+
+
+def run_variant(variant: str, art_set: str, kits: int, sheet_cm: tuple[int, int]) -> dict:
+    arts, items = {}, []
+    for slot, width_cm, height_cm in ART_SETS[art_set]:
+        arts[slot] = trim_transparent(synthetic_artwork(width_cm, height_cm))
+        items += [{"print_url": slot, "w": cm_to_px(width_cm), "h": cm_to_px(height_cm)}] * kits
+
+    size = (cm_to_px(sheet_cm[0]), cm_to_px(sheet_cm[1]))
+    sheets = pack_items_hybrid(items, *size)
+
+    rss0 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    before = Image.core.get_stats()["new_count"]
+    fitted, uses_left = {}, Counter(fit_key(i) for sheet in sheets for i in sheet.items)
+
+    t0 = time.perf_counter()
+    for sheet in sheets:
+        if variant == "legado":
+            legacy_sheet(sheet, size, arts)
+        else:
+            shared_sheet(sheet, size, arts, fitted, uses_left)
+    seconds = time.perf_counter() - t0
+
+    return {
+        "variant": variant,
+        "sheets": len(sheets),
+        "items": len(items),
+        "ms": seconds * 1000,
+        "images": Image.core.get_stats()["new_count"] - before,
+        "peak_mb": (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss0) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--kits", type=int, default=8)
+    parser.add_argument("--set", dest="art_set", choices=sorted(ART_SETS), default="camiseta")
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("fork")
+    for sheet_cm in ((30, 100), (57, 100)):
+        print(f"folha {sheet_cm[0]}x{sheet_cm[1]} cm, conjunto '{args.art_set}' x {args.kits} kits")
+        for variant in ("legado", "compartilhada"):
+            with ctx.Pool(processes=1) as pool:
+                r = pool.apply(run_variant, (variant, args.art_set, args.kits, sheet_cm))
+            print(
+                f"  {r['variant']:14s} {r['ms'] / r['sheets']:9.1f} ms/folha"
+                f" | {r['images'] / r['sheets']:6.1f} imagens/folha ({r['items']} itens, {r['sheets']} folhas)"
+                f" | pico RSS +{r['peak_mb']:.0f} MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
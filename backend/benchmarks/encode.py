@@ -0,0 +1,127 @@
+# backend/benchmarks/encode.py
+#
+# Memoria e tempo do encode de uma folha, comparados com o save do Pillow.
+# Cada medicao roda num processo novo: o pico de RSS (ru_maxrss) acima do
+# que a folha ja ocupa cobre a chamada inteira de encode_png_to, inclusive
+# os buffers do lado C (Pillow/zlib) que o tracemalloc nao enxerga.
+#
+#   python -m backend.benchmarks.encode [--sizes 30x100,57x100] [--profiles fast,balanced]
+#
+# backend/tests/test_png_encoder.py usa measure() para limitar o pico.
+
+import os
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9/")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "benchmark")
+os.environ.setdefault("ENV", "production")
+
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+import tempfile
+from PIL import Image
+
+from backend.benchmarks.render import synthetic_artwork
+from backend.png_encoder import PNG_PROFILES, encode_png_to
+from backend.print_utils import cm_to_px
+
+# referencia: o encoder do proprio Pillow
+PILLOW = "pillow"
+
+
+def synthetic_sheet(width_cm: int, height_cm: int) -> Image.Image:
+    sheet = Image.new("RGBA", (cm_to_px(width_cm), cm_to_px(height_cm)), (255, 255, 255, 0))
+    art = synthetic_artwork(10, 10)
+    for y in range(0, sheet.height - art.height + 1, art.height):
+        for x in range(0, sheet.width - art.width + 1, art.width):
+            sheet.alpha_composite(art, dest=(x, y))
+    return sheet
+
+
+def _reset_peak_rss():
+    # Linux: "5" em clear_refs zera o VmHWM, entao o pico de montar a folha
+    # nao esconde o do encode
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _max_rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run(width_cm: int, height_cm: int, profile: str) -> dict:
+    """Processo filho: monta a folha e mede so o encode para um arquivo."""
+    img = synthetic_sheet(width_cm, height_cm)
+    img.load()
+    _reset_peak_rss()
+    base = _max_rss_mb()
+
+    t0 = time.perf_counter()
+    with tempfile.TemporaryFile() as out:
+        if profile == PILLOW:
+            img.save(out, format="PNG", dpi=(300, 300))
+        else:
+            encode_png_to(img, out, profile, dpi=300)
+        size = out.tell()
+
+    return {
+        "ms": round((time.perf_counter() - t0) * 1000, 1),
+        "bytes": size,
+        "rss_mb": round(_max_rss_mb() - base, 1),
+        "sheet_mb": round(img.width * img.height * 4 / 1e6, 1),
+    }
+
+
+def measure(width_cm: int, height_cm: int, profile: str, env: dict | None = None) -> dict:
+    """
+    Roda _run num processo novo (pico de RSS proprio). env sobrepoe
+    variaveis do filho, p.ex. PNG_ENCODE_THREADS.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-m", "backend.benchmarks.encode", "--child", f"{width_cm}x{height_cm}", profile],
+        env={**os.environ, **(env or {})}, capture_output=True, text=True, check=True,
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="30x100,57x100")
+    parser.add_argument("--profiles", default="fast,balanced")
+    parser.add_argument("--child", nargs=2, metavar=("SIZE", "PROFILE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        size, profile = args.child
+        width_cm, height_cm = (int(v) for v in size.split("x"))
+        print(json.dumps(_run(width_cm, height_cm, profile)))
+        return
+
+    for size in args.sizes.split(","):
+        width_cm, height_cm = (int(v) for v in size.split("x"))
+        print(f"folha {size} cm")
+        for profile in [PILLOW, *args.profiles.split(",")]:
+            if profile != PILLOW and profile not in PNG_PROFILES:
+                parser.error(f"perfil desconhecido: {profile}")
+            r = measure(width_cm, height_cm, profile)
+            print(
+                f"  {profile:9s} {r['ms']:8.1f} ms | {r['bytes'] / 1e6:6.1f} MB"
+                f" | pico +{r['rss_mb']:.0f} MB RSS (folha {r['sheet_mb']:.0f} MB)"
+            )
+
+
+if __name__ == "__main__":
+    main()
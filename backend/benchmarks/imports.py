@@ -0,0 +1,72 @@
+# backend/benchmarks/imports.py
+#
+# Tempo de import (cold start) da API e do modulo de jobs, num processo
+# novo por rodada via python -X importtime. Mostra o total, os modulos
+# mais caros e se os pesados que so o worker usa (render engine, encoder,
+# Pillow, ingest, Stripe) ficaram fora do import da API.
+#
+#   python -m backend.benchmarks.imports [--runs 5] [--top 10]
+
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+
+ENV = {
+    "SUPABASE_URL": "http://127.0.0.1:9/",
+    "SUPABASE_SERVICE_ROLE_KEY": "benchmark",
+    "SUPABASE_JWT_SECRET": "benchmark",
+    "REDIS_URL": "redis://127.0.0.1:9/0",
+    "ENV": "production",
+}
+
+TARGETS = ("backend.main", "backend.jobs")
+# so deveriam ser importados no worker (ou na rota que usa)
+WORKER_ONLY = ("backend.render_engine", "backend.png_encoder", "backend.artwork_ingest", "PIL", "stripe")
+
+
+def import_times(module: str) -> dict[str, float]:
+    """Tempo cumulativo (ms) de cada modulo importado por `import module`."""
+    env = {**os.environ, **{k: os.environ.get(k, v) for k, v in ENV.items()}}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative) / 1000
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    for module in TARGETS:
+        runs = [import_times(module) for _ in range(args.runs)]
+        totals = [r[module] for r in runs]
+        print(f"{module}: {statistics.median(totals):.0f} ms (mediana de {args.runs}, min {min(totals):.0f})")
+
+        last = runs[-1]
+        top = sorted(
+            ((name, ms) for name, ms in last.items() if "." not in name and name != "backend"),
+            key=lambda r: -r[1],
+        )[:args.top]
+        for name, ms in top:
+            print(f"    {name:28s} {ms:8.1f} ms")
+
+        loaded = [name for name in WORKER_ONLY if name in last]
+        print(f"    so do worker carregados: {', '.join(loaded) or 'nenhum'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+# backend/benchmarks/render.py
+#
+# Render completo (fetch, pack, trim, resize, composite, marca d'agua,
+# encode, ZIP) sem Supabase: o Storage vira um diretorio temporario servido
+# por HTTP local e a tabela jobs/print_files vira um dict em memoria.
+# Artes sinteticas em tamanho real a 300 dpi.
+#
+#   python -m backend.benchmarks.render [--kits 6] [--set camiseta] [--sizes 30x100,57x100]
+#
+# Cada folha/modo roda num processo novo (caches frios, pico de RSS proprio).
+
+import os
+
+# supabase_client exige as variaveis, mas nada aqui fala com o Supabase
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9/")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "benchmark")
+os.environ.setdefault("ENV", "production")
+
+import argparse
+import functools
+import http.server
+import multiprocessing
+import resource
+import tempfile
+import threading
+import time
+import uuid
+from PIL import Image, ImageDraw
+
+from backend import artwork_store, jobs, render_cache, render_engine, sheet_profiles, storage_uploader
+from backend.print_utils import cm_to_px
+
+# conjuntos de arte por kit: (slot, largura_cm, altura_cm)
+ART_SETS = {
+    "camiseta": [("front", 28, 35), ("back", 28, 35), ("extra", 8, 8)],
+    "infantil": [("front", 18, 22), ("back", 18, 22), ("extra", 6, 6)],
+    "grande": [("front", 50, 45), ("extra", 10, 10)],
+}
+
+
+# =========================
+# STORAGE / TABELAS LOCAIS
+# =========================
+
+class _Result:
+    def __init__(self, data):
+        self.data = data
+
+
+class LocalQuery:
+    """O minimo do query builder do PostgREST usado por jobs/render_engine."""
+
+    def __init__(self, tables: dict, name: str):
+        self.rows = tables.setdefault(name, [])
+        self.tables = tables
+        self.name = name
+        self.filters = []
+        self.op = "select"
+        self.value = None
+        self.one = False
+
+    def select(self, *_args, **_kwargs):
+        self.op = "select"
+        return self
+
+    def insert(self, value):
+        self.op, self.value = "insert", value
+        return self
+
+    def update(self, value):
+        self.op, self.value = "update", value
+        return self
+
+    def delete(self):
+        self.op = "delete"
+        return self
+
+    def eq(self, key, value):
+        self.filters.append((key, value))
+        return self
+
+    def single(self):
+        self.one = True
+        return self
+
+    def execute(self):
+        match = [r for r in self.rows if all(r.get(k) == v for k, v in self.filters)]
+
+        if self.op == "insert":
+            values = self.value if isinstance(self.value, list) else [self.value]
+            self.rows.extend(dict(v) for v in values)
+            return _Result(values)
+        if self.op == "update":
+            for r in match:
+                r.update(self.value)
+            return _Result(match)
+        if self.op == "delete":
+            self.tables[self.name] = [r for r in self.rows if r not in match]
+            return _Result(match)
+
+        match = [dict(r) for r in match]
+        if self.one:
+            return _Result(match[0] if match else None)
+        return _Result(match)
+
+
+class LocalBucket:
+    def __init__(self, root: str, base_url: str, name: str):
+        self.dir = os.path.join(root, name)
+        self.base_url = f"{base_url}/{name}"
+
+    def upload(self, path, data, options=None):
+        target = os.path.join(self.dir, path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if isinstance(data, str):
+            with open(data, "rb") as f:
+                data = f.read()
+        elif hasattr(data, "read"):
+            data = data.read()
+        with open(target, "wb") as f:
+            f.write(data)
+
+    def get_public_url(self, path):
+        return f"{self.base_url}/{path}"
+
+
+class LocalStorage:
+    def __init__(self, root: str, base_url: str):
+        self.root = root
+        self.base_url = base_url
+
+    def from_(self, bucket):
+        return LocalBucket(self.root, self.base_url, bucket)
+
+
+class LocalSupabase:
+    def __init__(self, root: str, base_url: str):
+        self.tables: dict[str, list] = {}
+        self.storage = LocalStorage(root, base_url)
+
+    def table(self, name):
+        return LocalQuery(self.tables, name)
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def serve_directory(root: str) -> str:
+    handler = functools.partial(_QuietHandler, directory=root)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+# =========================
+# ARTES SINTETICAS
+# =========================
+
+def synthetic_artwork(width_cm: float, height_cm: float) -> Image.Image:
+    """Ruido suavizado (comprime como foto/ilustracao) com borda transparente."""
+    w, h = cm_to_px(width_cm), cm_to_px(height_cm)
+    noise = Image.effect_noise((max(1, w // 16), max(1, h // 16)), 80).resize((w, h), Image.BILINEAR)
+    img = Image.merge("RGB", (
+        noise,
+        noise.transpose(Image.FLIP_LEFT_RIGHT),
+        noise.transpose(Image.FLIP_TOP_BOTTOM),
+    )).convert("RGBA")
+
+    alpha = Image.new("L", (w, h), 0)
+    ImageDraw.Draw(alpha).ellipse((w // 20, h // 20, w * 19 // 20, h * 19 // 20), fill=255)
+    img.putalpha(alpha)
+    return img
+
+
+def build_pieces(storage: LocalStorage, art_set: str, kits: int) -> list[dict]:
+    bucket = storage.from_("prints")
+    pieces = []
+    for slot, width_cm, height_cm in ART_SETS[art_set]:
+        path = f"bench/{art_set}-{slot}.png"
+        target = os.path.join(bucket.dir, path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        synthetic_artwork(width_cm, height_cm).save(target, format="PNG", compress_level=1)
+
+        url = bucket.get_public_url(path)
+        pieces.extend({"url": url, "width": width_cm, "height": height_cm} for _ in range(kits))
+    return pieces
+
+
+# =========================
+# CENARIO
+# =========================
+
+def run_scenario(sheet_size: str, preview: bool, art_set: str, kits: int, use_cache: bool) -> dict:
+    with tempfile.TemporaryDirectory(prefix="pvty-bench-") as root:
+        return _run_scenario(root, sheet_size, preview, art_set, kits, use_cache)
+
+
+def _run_scenario(root: str, sheet_size: str, preview: bool, art_set: str, kits: int, use_cache: bool) -> dict:
+    base_url = serve_directory(root)
+    local = LocalSupabase(root, base_url)
+    for mod in (jobs, render_engine, sheet_profiles, storage_uploader):
+        mod.supabase = local
+    storage_uploader.STORAGE_PUBLIC_URL = base_url
+    storage_uploader.STORAGE_TUS_THRESHOLD_BYTES = 0
+    render_cache.CACHE_ENABLED = use_cache
+    artwork_store.ARTWORK_STORE_DIR = os.path.join(root, "artwork-store")
+
+    pieces = build_pieces(local.storage, art_set, kits)
+    job_id = str(uuid.uuid4())
+    local.table("jobs").insert({
+        "id": job_id,
+        "user_id": "benchmark",
+        "status": "preview" if preview else "queued",
+        "payload": {"pieces": pieces, "sheet_size": sheet_size, "kits": kits},
+    }).execute()
+
+    t0 = time.perf_counter()
+    jobs.process_render(job_id, preview=preview)
+    seconds = time.perf_counter() - t0
+
+    job = local.table("jobs").select("*").eq("id", job_id).single().execute().data
+    payload = job["payload"]
+    return {
+        "sheet_size": sheet_size,
+        "mode": "previa" if preview else "final",
+        "pieces": len(pieces),
+        "sheets": payload.get("sheets") or 0,
+        "seconds": seconds,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "stages": payload["metrics"]["stages"],
+    }
+
+
+def print_result(r: dict):
+    per_min = r["sheets"] / r["seconds"] * 60 if r["seconds"] else 0.0
+    print(
+        f"folha {r['sheet_size']:7s} {r['mode']:6s} | {r['pieces']:3d} pecas -> {r['sheets']:2d} folhas"
+        f" | {r['seconds']:7.2f} s | {per_min:7.1f} folhas/min | pico RSS {r['max_rss_mb']:7.0f} MB"
+    )
+    for stage, s in sorted(r["stages"].items(), key=lambda kv: -kv[1]["ms"]):
+        extra = f"  {s['bytes'] / 1e6:8.1f} MB" if s.get("bytes") else ""
+        print(f"    {stage:14s} {s['ms']:10.1f} ms  x{s['count']:<4d}{extra}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--kits", type=int, default=6)
+    parser.add_argument("--set", dest="art_set", choices=sorted(ART_SETS), default="camiseta")
+    parser.add_argument("--sizes", default="30x100,57x100")
+    parser.add_argument("--no-preview", action="store_true")
+    parser.add_argument("--cache", action="store_true", help="liga o cache de folhas (desligado por padrao)")
+    args = parser.parse_args()
+
+    modes = [False] if args.no_preview else [True, False]
+    print(f"conjunto '{args.art_set}' x {args.kits} kits, {os.cpu_count()} CPUs")
+
+    # fork: um processo por cenario, sem herdar caches de imagem do anterior
+    ctx = multiprocessing.get_context("fork")
+    for sheet_size in args.sizes.split(","):
+        for preview in modes:
+            with ctx.Pool(processes=1) as pool:
+                result = pool.apply(run_scenario, (sheet_size, preview, args.art_set, args.kits, args.cache))
+            print_result(result)
+
+
+if __name__ == "__main__":
+    main()
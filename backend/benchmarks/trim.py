@@ -0,0 +1,68 @@
+# backend/benchmarks/trim.py
+#
+# Compara o trim antigo (getbbox + ImageChops.difference contra uma imagem
+# transparente do mesmo tamanho) com o bbox direto no canal alpha.
+#
+#   python -m backend.benchmarks.trim [--repeat 5]
+
+import argparse
+import time
+from PIL import Image, ImageChops, ImageDraw
+
+from backend.print_utils import alpha_bbox, cm_to_px
+
+
+def synthetic_artwork(width_cm: float, height_cm: float) -> Image.Image:
+    w, h = cm_to_px(width_cm), cm_to_px(height_cm)
+    img = Image.new("RGBA", (w, h), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    draw.ellipse((w // 8, h // 8, w * 7 // 8, h * 7 // 8), fill=(200, 40, 40, 255))
+    # ruido quase transparente perto da borda, comum em PNG exportado
+    draw.rectangle((2, 2, 20, 20), fill=(0, 0, 0, 3))
+    return img
+
+
+def legacy_trim(img: Image.Image) -> Image.Image:
+    bbox = img.getbbox()
+    if bbox:
+        img = img.crop(bbox)
+    bg = Image.new(img.mode, img.size, (0, 0, 0, 0))
+    bbox = ImageChops.difference(img, bg).getbbox()
+    return img.crop(bbox) if bbox else img
+
+
+def alpha_trim(img: Image.Image, threshold: int) -> Image.Image:
+    bbox = alpha_bbox(img, threshold)
+    return img.crop(bbox) if bbox else img
+
+
+def bench(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for width_cm, height_cm in ((28, 35), (50, 90)):
+        img = synthetic_artwork(width_cm, height_cm)
+        print(f"arte {width_cm}x{height_cm} cm @300dpi = {img.width}x{img.height}px")
+
+        legacy = bench(lambda: legacy_trim(img), args.repeat)
+        alpha = bench(lambda: alpha_trim(img, 0), args.repeat)
+        alpha_t = bench(lambda: alpha_trim(img, 8), args.repeat)
+
+        print(f"  legado (getbbox + difference): {legacy * 1000:8.1f} ms")
+        print(f"  alpha bbox:                    {alpha * 1000:8.1f} ms  ({legacy / alpha:.1f}x)")
+        print(f"  alpha bbox threshold=8:        {alpha_t * 1000:8.1f} ms  ({legacy / alpha_t:.1f}x)")
+        print(f"  bbox: {alpha_bbox(img, 0)} -> threshold=8: {alpha_bbox(img, 8)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# backend/benchmarks/watermark.py
+#
+# Marca d'agua da previa: versao antiga (texto desenhado a cada folha +
+# blur na folha inteira) vs tile pre-desfocado + blur so nas artes.
+#
+#   python -m backend.benchmarks.watermark [--repeat 3]
+
+import argparse
+import time
+from PIL import Image, ImageDraw, ImageFilter
+
+from backend.print_config import DPI, PREVIEW_DPI
+from backend.print_utils import cm_to_px
+from backend.render_engine import apply_watermark, warm_watermark, WATERMARK_TEXT
+
+
+def legacy_watermark(img: Image.Image, text: str = WATERMARK_TEXT) -> Image.Image:
+    overlay = Image.new("RGBA", img.size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(overlay)
+
+    w, h = img.size
+    step = 260
+
+    for y in range(0, h, step):
+        for x in range(0, w, step):
+            draw.text((x, y), text, fill=(0, 0, 0, 30))
+
+    text_w, text_h = draw.textbbox((0, 0), text)[2:]
+    draw.text(((w - text_w) / 2, (h - text_h) / 2), text, fill=(0, 0, 0, 80))
+
+    img = Image.alpha_composite(img, overlay)
+    return img.filter(ImageFilter.GaussianBlur(radius=1.0))
+
+
+def synthetic_sheet(width_cm: int, height_cm: int):
+    w, h = cm_to_px(width_cm), cm_to_px(height_cm)
+    img = Image.new("RGBA", (w, h), (255, 255, 255, 0))
+    art = Image.new("RGBA", (cm_to_px(12), cm_to_px(15)), (30, 120, 200, 255))
+
+    regions = []
+    for y in range(0, h - art.height, art.height + 100):
+        for x in range(0, w - art.width, art.width + 100):
+            img.paste(art, (x, y))
+            regions.append((x, y, x + art.width, y + art.height))
+    return img, regions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for width_cm, height_cm in ((30, 100), (57, 100)):
+        sheet, regions = synthetic_sheet(width_cm, height_cm)
+        print(f"folha {width_cm}x{height_cm} cm = {sheet.width}x{sheet.height}px, {len(regions)} artes")
+
+        t0 = time.perf_counter()
+        warm_watermark(sheet.width)
+        print(f"  tile/faixa (uma vez por tamanho): {(time.perf_counter() - t0) * 1000:8.1f} ms")
+
+        scale = PREVIEW_DPI / DPI
+        small = sheet.resize((round(sheet.width * scale), round(sheet.height * scale)))
+        small_regions = [tuple(round(v * scale) for v in r) for r in regions]
+        warm_watermark(small.width)
+
+        for label, base, fn in (
+            ("legado", sheet, lambda img: legacy_watermark(img)),
+            ("tile + blur nas artes", sheet, lambda img: apply_watermark(img, regions=regions)),
+            (f"idem @ {PREVIEW_DPI} dpi", small, lambda img: apply_watermark(img, regions=small_regions)),
+        ):
+            best = float("inf")
+            for _ in range(args.repeat):
+                img = base.copy()
+                t0 = time.perf_counter()
+                fn(img)
+                best = min(best, time.perf_counter() - t0)
+            print(f"  {label:24s} {best * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,187 @@
 import uuid
 import os
+import time
+import shutil
 import zipfile
+import tempfile
+import threading
 import requests
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 from concurrent.futures import ThreadPoolExecutor
+from rq import Retry, get_current_job
 
 from backend.supabase_client import supabase
-from backend.render_engine import process_print_job
+from backend import storage_uploader
+from backend.stage_timer import StageTimer
+from backend.metrics import record_job_timing
+from backend.profiling import start_job_profiler
+
+CANCEL_POLL_SECONDS = float(os.getenv("JOB_CANCEL_POLL_SECONDS", "2"))
+
+# =========================
+# RETRY / HEARTBEAT
+# =========================
+# attempts (coluna em jobs) e o orcamento unico: conta cada vez que um
+# worker pega o job, seja retry do RQ (excecao/timeout) ou do reaper
+# (worker morto, ver backend/reaper.py).
+
+RENDER_JOB_TIMEOUT = 600
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BASE_SECONDS = int(os.getenv("JOB_RETRY_BASE_SECONDS", "30"))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "30"))
+
+
+def retry_backoff(attempt: int) -> int:
+    """Espera antes da tentativa seguinte a `attempt` (30s, 60s, 120s...)."""
+    return JOB_RETRY_BASE_SECONDS * 2 ** max(0, attempt - 1)
+
+
+def _render_retry() -> Retry:
+    # intervalos com atraso exigem worker com scheduler (backend/worker.py)
+    return Retry(
+        max=JOB_MAX_ATTEMPTS - 1,
+        interval=[retry_backoff(a) for a in range(1, JOB_MAX_ATTEMPTS)],
+    )
+
+
+def enqueue_render(queue, job_id: str, preview: bool, delay: int = 0):
+    kwargs = {
+        "preview": preview,
+        "job_timeout": RENDER_JOB_TIMEOUT,
+        "retry": _render_retry(),
+    }
+    if delay:
+        return queue.enqueue_in(timedelta(seconds=delay), process_render, job_id, **kwargs)
+    return queue.enqueue(process_render, job_id, **kwargs)
+
+
+def enqueue_renders(queue, job_ids: list[str], preview: bool):
+    """Varios jobs num unico pipeline do Redis (um round-trip)."""
+    return queue.enqueue_many([
+        queue.prepare_data(
+            process_render,
+            args=(job_id,),
+            kwargs={"preview": preview},
+            timeout=RENDER_JOB_TIMEOUT,
+            retry=_render_retry(),
+        )
+        for job_id in job_ids
+    ])
+
+
+class Heartbeat(threading.Thread):
+    """Atualiza jobs.heartbeat_at enquanto o job roda."""
+
+    def __init__(self, job_id: str):
+        super().__init__(name=f"heartbeat-{job_id[:8]}", daemon=True)
+        self.job_id = job_id
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(JOB_HEARTBEAT_SECONDS):
+            try:
+                supabase.table("jobs").update({
+                    "heartbeat_at": datetime.now(timezone.utc).isoformat()
+                }).eq("id", self.job_id).execute()
+            except Exception as e:
+                print(f"⚠️ Heartbeat do job {self.job_id} falhou: {e}")
+
+    def stop(self):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+
+
+# =========================
+# GANG
+# =========================
+# Job gang: pecas de varios pedidos do mesmo usuario/tamanho de folha
+# empacotadas juntas (POST /print-jobs/gang). Os pedidos ficam "ganged"
+# com gang_id apontando para o job gang e herdam o resultado dele.
+
+def gang_member_sheets(result_files: list[dict]) -> dict[str, list[dict]]:
+    """job_id do pedido -> folhas do gang em que ele tem pecas."""
+    members: dict[str, list[dict]] = {}
+    for r in result_files:
+        for member_id in dict.fromkeys(p["job_id"] for p in r.get("placements") or []):
+            members.setdefault(member_id, []).append(r)
+    return members
+
+
+def finish_gang_members(gang_id: str, result_files: list[dict], zip_url: str, finished_at: str):
+    members = gang_member_sheets(result_files)
+    if not members:
+        return
+
+    # cada pedido passa a listar as folhas compartilhadas (no lugar da previa)
+    supabase.table("print_files").delete().in_("job_id", list(members)).execute()
+    supabase.table("print_files").insert([
+        {
+            "id": str(uuid.uuid4()),
+            "job_id": member_id,
+            "file_path": None,
+            "public_url": r["url"],
+            "page_index": r["page_index"],
+            "preview": False,
+            "sheet_key": r["sheet_key"],
+        }
+        for member_id, sheets in members.items()
+        for r in sheets
+    ]).execute()
+
+    for member_id, sheets in members.items():
+        supabase.table("jobs").update({
+            "status": "done",
+            "zip_url": zip_url,
+            "sheets": len(sheets),
+            "file_count": len(sheets),
+            "finished_at": finished_at,
+        }).eq("id", member_id).eq("gang_id", gang_id).execute()
+
+
+def close_gang_members(gang_id: str, fields: dict):
+    """Gang cancelado/com erro: os pedidos dele terminam igual."""
+    supabase.table("jobs").update(fields).eq("gang_id", gang_id).eq("status", "ganged").execute()
+
+
+def load_checkpoints(job_id: str, preview: bool) -> dict[int, dict]:
+    rows = (
+        supabase.table("print_files")
+        .select("id,public_url,page_index,sheet_key")
+        .eq("job_id", job_id)
+        .eq("preview", preview)
+        .execute()
+        .data
+    ) or []
+    return {r["page_index"]: r for r in rows if r.get("sheet_key")}
+
+
+def cancel_poller(job_id: str):
+    """
+    should_cancel() para o render: le o status do job no maximo a cada
+    CANCEL_POLL_SECONDS (chamado entre folhas, de varias threads).
+    """
+    state = {"checked_at": 0.0, "cancel": False}
+    lock = threading.Lock()
+
+    def should_cancel(force: bool = False) -> bool:
+        with lock:
+            if state["cancel"]:
+                return True
+            if force or time.monotonic() - state["checked_at"] >= CANCEL_POLL_SECONDS:
+                state["checked_at"] = time.monotonic()
+                job = supabase.table("jobs").select("status").eq("id", job_id).single().execute().data or {}
+                state["cancel"] = job.get("status") == "cancelling"
+            return state["cancel"]
+
+    return should_cancel
 
 
 def process_render(job_id: str, preview: bool = False):
+    # render engine (Pillow, caches) so no worker: a API importa este modulo
+    # so para enfileirar; o worker ja o pre-carrega antes do fork
+    from backend.render_engine import process_print_job, RenderCancelled
+
     print(f"▶️ Starting render for job {job_id}, preview={preview}")
 
     job = supabase.table("jobs").select("*").eq("id", job_id).single().execute().data
@@ -17,6 +189,7 @@ def process_render(job_id: str, preview: bool = False):
         raise Exception(f"Job {job_id} not found")
 
     expected_status = "preview" if preview else "queued"
+    running = "processing_preview" if preview else "processing"
     if job["status"] != expected_status:
         print(f"⚠️ Job {job_id} status is {job['status']}, expected {expected_status}. Skipping.")
         return
@@ -29,117 +202,241 @@ def process_render(job_id: str, preview: bool = False):
 
     print(f"📦 Job {job_id} has {len(pieces)} pieces")
 
-    # Limpeza preventiva
-    q = supabase.table("print_files").delete().eq("job_id", job_id)
-    if preview:
-        q = q.eq("preview", True)
-    q.execute()
+    # Claim atomico: retry do RQ e re-enqueue do reaper podem disputar o job
+    attempts = (job.get("attempts") or 0) + 1
+    claimed = supabase.table("jobs").update({
+        "status": running,
+        "attempts": attempts,
+        "heartbeat_at": datetime.now(timezone.utc).isoformat(),
+    }).eq("id", job_id).eq("status", expected_status).execute()
+
+    if not claimed.data:
+        print(f"⚠️ Job {job_id} already claimed by another worker. Skipping.")
+        return
+
+    timer = StageTimer(job_id, preview=preview, pieces=len(pieces))
+    started = time.perf_counter()
+    new_payload = dict(payload)
+
+    metrics_done = []
+
+    def finish_metrics(status: str):
+        # uma vez por execucao: um cancel que chega depois do fim (ver abaixo)
+        # nao registra o job de novo
+        if metrics_done:
+            return
+        metrics_done.append(status)
+        new_payload["metrics"] = timer.log_summary()
+        record_job_timing(new_payload["metrics"], time.perf_counter() - started, preview, status)
+        if profiler:
+            artifacts = profiler.finish()
+            if artifacts:
+                new_payload["profiles"] = {**(payload.get("profiles") or {}), artifacts["kind"]: artifacts}
+
+    # Folhas ja entregues numa execucao anterior ficam como checkpoint;
+    # a previa sai quando a final roda
+    checkpoints = load_checkpoints(job_id, preview)
+    if not preview:
+        supabase.table("print_files").delete().eq("job_id", job_id).eq("preview", True).execute()
+
+    def record_sheets(results: list[dict]):
+        rows = [
+            {
+                "id": str(uuid.uuid4()),
+                "job_id": job_id,
+                "file_path": None,
+                "public_url": r["url"],
+                "page_index": r["page_index"],
+                "preview": preview,
+                "sheet_key": r["sheet_key"],
+            }
+            for r in results
+        ]
+        with timer.span("db_files", items=len(rows)):
+            supabase.table("print_files").insert(rows).execute()
 
-    supabase.table("jobs").update({
-        "status": "processing_preview" if preview else "processing"
-    }).eq("id", job_id).execute()
+    should_cancel = cancel_poller(job_id)
+    heartbeat = Heartbeat(job_id)
+    profiler = None
+    workdir = None
 
     try:
-        result_files = process_print_job(job_id, pieces, preview=preview)
+        # dentro do try: se o profiler ou o mkdtemp falharem, o finally para
+        # o heartbeat (no worker sem fork o processo continua vivo)
+        heartbeat.start()
+        profiler = start_job_profiler(job_id, payload, preview)
+        # diretorio por job (jobs simultaneos no mesmo host nao se atropelam):
+        # a final encoda as folhas direto aqui e o ZIP le do disco
+        workdir = None if preview else tempfile.mkdtemp(prefix=f"pvty-{job_id}-")
+
+        result_files = process_print_job(
+            job_id,
+            pieces,
+            preview=preview,
+            timer=timer,
+            checkpoints=checkpoints,
+            on_sheets=record_sheets,
+            should_cancel=should_cancel,
+            spool_dir=workdir,
+        )
 
         if not isinstance(result_files, list):
             raise Exception("process_print_job did not return a list")
 
-        rows = []
-        file_paths = []
-        file_urls = []
-
-        for idx, f in enumerate(result_files):
-            if isinstance(f, str):
-                file_path = None
-                public_url = f
-                page_index = idx
-            elif isinstance(f, dict):
-                file_path = f.get("path")
-                public_url = f.get("url")
-                page_index = f.get("page_index", idx)
-            else:
-                raise Exception(f"Invalid file result at index {idx}: {f}")
-
-            rows.append({
-                "id": str(uuid.uuid4()),
-                "job_id": job_id,
-                "file_path": file_path,
-                "public_url": public_url,
-                "page_index": page_index,
-                "preview": preview,
-            })
-
-            if file_path:
-                file_paths.append(file_path)
-            if public_url:
-                file_urls.append(public_url)
+        # checkpoints que nao batem mais com o empacotamento atual
+        stale = [
+            c["id"] for idx, c in checkpoints.items()
+            if idx >= len(result_files) or not result_files[idx].get("resumed")
+        ]
+        if stale:
+            supabase.table("print_files").delete().in_("id", stale).execute()
 
-        if rows:
-            supabase.table("print_files").insert(rows).execute()
+        encodes = [f["encode"] for f in result_files if f.get("encode")]
 
         sheets = len(result_files)
 
-        new_payload = dict(payload)
         new_payload["sheets"] = sheets
-
+        new_payload["film_cm"] = round(sum(f.get("length_cm") or 0 for f in result_files), 1)
+        if payload.get("gang"):
+            new_payload["gang"] = {
+                **payload["gang"],
+                "sheets": [
+                    {"page_index": r["page_index"], "placements": r.get("placements") or []}
+                    for r in result_files
+                ],
+            }
+        if encodes:
+            new_payload["encoding"] = {
+                "profile": encodes[0]["profile"],
+                "sheets": len(encodes),
+                "ms": round(sum(e["ms"] for e in encodes), 1),
+                "bytes": sum(e["bytes"] for e in encodes),
+            }
+            print(f"🗜️ Job {job_id}: {len(encodes)} PNGs ({encodes[0]['profile']}) em {new_payload['encoding']['ms']} ms")
+
+        # uma linha de print_files por folha (as da previa somem na final)
         supabase.table("jobs").update({
-            "payload": new_payload
+            "sheets": sheets,
+            "file_count": sheets,
+            "payload": new_payload,
         }).eq("id", job_id).execute()
 
+        if should_cancel(force=True):
+            raise RenderCancelled(job_id)
+
         if not preview:
             zip_name = "PVTYARQUIVOS.zip"
-            zip_local = f"/tmp/{zip_name}"
-
-            def download(args):
-                i, url = args
-                r = requests.get(url, timeout=20)
-                r.raise_for_status()
-                tmp = f"/tmp/PVTY_PAGE_{i+1}.png"
-                with open(tmp, "wb") as f:
-                    f.write(r.content)
+            zip_local = os.path.join(workdir, zip_name)
+
+            def local_page(f: dict) -> str:
+                if f.get("path") and os.path.exists(f["path"]):
+                    return f["path"]
+                # folha do cache ou de checkpoint: nao foi encodada aqui
+                tmp = os.path.join(workdir, f"PVTY_PAGE_{f['page_index'] + 1}.png")
+                with requests.get(f["url"], timeout=20, stream=True) as r:
+                    r.raise_for_status()
+                    with open(tmp, "wb") as out:
+                        for chunk in r.iter_content(1024 * 1024):
+                            out.write(chunk)
                 return tmp
 
-            with zipfile.ZipFile(zip_local, "w", zipfile.ZIP_DEFLATED) as z:
-                if file_paths:
-                    for i, path in enumerate(file_paths):
-                        if os.path.exists(path):
-                            z.write(path, arcname=f"PVTY_PAGE_{i+1}.png")
-                else:
-                    with ThreadPoolExecutor(max_workers=4) as ex:
-                        downloaded = list(ex.map(download, enumerate(file_urls)))
-
-                    for i, tmp in enumerate(downloaded):
-                        if tmp and os.path.exists(tmp):
-                            z.write(tmp, arcname=f"PVTY_PAGE_{i+1}.png")
+            with timer.span("zip", items=len(result_files)) as c:
+                with ThreadPoolExecutor(max_workers=4) as ex:
+                    pages = list(ex.map(local_page, result_files))
+                with zipfile.ZipFile(zip_local, "w", zipfile.ZIP_DEFLATED) as z:
+                    for i, page in enumerate(pages):
+                        z.write(page, arcname=f"PVTY_PAGE_{i+1}.png")
+                c["bytes"] = os.path.getsize(zip_local)
 
+            # ZIP grande vai por upload resumivel, lido do disco
             storage_path = f"{job['user_id']}/{job_id}/{zip_name}"
-            with open(zip_local, "rb") as f:
-                supabase.storage.from_("exports").upload(storage_path, f, {"upsert": "true"})
-
-            zip_url = supabase.storage.from_("exports").get_public_url(storage_path)
+            with timer.span("zip_upload", items=1, bytes=os.path.getsize(zip_local)):
+                zip_url = storage_uploader.upload("exports", storage_path, zip_local, "application/zip")
 
-            supabase.table("jobs").update({
+            finish_metrics("done")
+            finished_at = datetime.now(timezone.utc).isoformat()
+            done = supabase.table("jobs").update({
                 "status": "done",
+                "payload": new_payload,
                 "zip_url": zip_url,
-                "finished_at": datetime.now(timezone.utc).isoformat()
-            }).eq("id", job_id).execute()
+                "finished_at": finished_at,
+            }).eq("id", job_id).eq("status", running).execute()
+            if not done.data:
+                # cancel pedido durante o ZIP/upload: a API ja respondeu "cancelling"
+                raise RenderCancelled(job_id)
+
+            if payload.get("gang"):
+                finish_gang_members(job_id, result_files, zip_url, finished_at)
 
             print(f"📦 ZIP generated and uploaded: {zip_url}")
 
         else:
-            supabase.table("jobs").update({
-                "status": "preview_done"
-            }).eq("id", job_id).execute()
+            finish_metrics("preview_done")
+            done = supabase.table("jobs").update({
+                "status": "preview_done",
+                "payload": new_payload,
+            }).eq("id", job_id).eq("status", running).execute()
+            if not done.data:
+                raise RenderCancelled(job_id)
 
         print(f"✅ Job {job_id} finished with {sheets} sheets")
 
+    except RenderCancelled:
+        print(f"🛑 Job {job_id} cancelado")
+
+        finish_metrics("cancelled")
+        finished_at = datetime.now(timezone.utc).isoformat()
+        cancelled = supabase.table("jobs").update({
+            "status": "cancelled",
+            "payload": new_payload,
+            "finished_at": finished_at,
+        }).eq("id", job_id).in_("status", [running, "cancelling"]).execute()
+
+        if cancelled.data and payload.get("gang"):
+            close_gang_members(job_id, {"status": "cancelled", "finished_at": finished_at})
+
     except Exception as e:
-        print(f"❌ Job {job_id} failed: {e}")
+        # Retry do RQ (com backoff) enquanto houver orcamento: o job volta
+        # para o status de entrada e retoma dos checkpoints
+        rq_job = get_current_job()
+        retrying = bool(rq_job and rq_job.retries_left) and attempts < JOB_MAX_ATTEMPTS
 
-        supabase.table("jobs").update({
-            "status": "error",
-            "error": str(e)
-        }).eq("id", job_id).execute()
+        if retrying:
+            print(f"🔁 Job {job_id} failed (tentativa {attempts}/{JOB_MAX_ATTEMPTS}), retry em {retry_backoff(attempts)}s: {e}")
+        else:
+            print(f"❌ Job {job_id} failed: {e}")
+
+        finish_metrics("retry" if retrying else "error")
+        failed = supabase.table("jobs").update({
+            "status": expected_status if retrying else "error",
+            "error": str(e),
+            "payload": new_payload,
+        }).eq("id", job_id).eq("status", running).execute()
+
+        if not failed.data:
+            # O job saiu de running durante a falha: cancel pedido (cancelling)
+            # ou ja entregue (done; falhou so o fechamento do gang). Nao
+            # sobrescreve o status e o RQ nao tenta de novo
+            if rq_job:
+                rq_job.retries_left = 0
+            finished_at = datetime.now(timezone.utc).isoformat()
+            cancelled = supabase.table("jobs").update({
+                "status": "cancelled",
+                "payload": new_payload,
+                "finished_at": finished_at,
+            }).eq("id", job_id).eq("status", "cancelling").execute()
+            if cancelled.data:
+                print(f"🛑 Job {job_id} cancelado durante a falha")
+                if payload.get("gang"):
+                    close_gang_members(job_id, {"status": "cancelled", "finished_at": finished_at})
+            raise
+
+        if payload.get("gang") and not retrying:
+            close_gang_members(job_id, {"status": "error", "error": str(e)})
 
         raise
+
+    finally:
+        heartbeat.stop()
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
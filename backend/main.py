@@ -1,23 +1,34 @@
 import uuid
 import os
+import hmac
+import time
 from datetime import datetime, timezone, timedelta
 from math import ceil
-from fastapi import FastAPI, HTTPException, Depends, Request, Query, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, Depends, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
+from storage3.types import CreateSignedUploadUrlOptions
+import requests
 from backend.job_queue import queue
-from backend.jobs import process_render
+from backend import storage_uploader
+from backend.jobs import enqueue_render, enqueue_renders, close_gang_members
+from backend.sheet_profiles import sheet_profiles, resolve_sheet_profile, job_sheet_profile
+from backend.packing import count_sheets
+from backend.print_config import resolve_profile
+from backend.metrics import HTTP_REQUEST_SECONDS, instrument_supabase, render_latest
+from backend.pagination import NEXT_CURSOR_HEADER, keyset_page, split_page
+from backend.upload_utils import spool_multipart_upload, probe_image_range, UploadRejected, UPLOAD_MIME_TYPES, UPLOAD_EXTENSIONS
 from backend.auth import get_current_user
-from backend.supabase_client import supabase
+from backend.supabase_client import supabase, get_async_supabase, close_async_supabase
 from backend.limits import check_and_consume_limits, LimitExceeded
-from backend.services.usage_service import get_usage, consume_usage
+from backend.services.usage_service import get_usage, aget_usage, consume_usage
 from backend.app.routes import fiscal
 from fastapi import Header
 from backend.auth import get_current_user
 from backend.utils.validators import validate_document
-import stripe
 
 INTERNAL_KEY = os.getenv("INTERNAL_API_KEY")
 
@@ -29,9 +40,6 @@ except Exception as e:
     print("⚠️ Stripe desativado:", e)
     STRIPE_ENABLED = False
 
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
-STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
-
 LOCAL_TZ = timezone(timedelta(hours=-3))
 DEV_NO_AUTH = os.getenv("DEV_NO_AUTH", "false").lower() == "true"
 
@@ -42,6 +50,15 @@ if STRIPE_ENABLED:
 
 app.include_router(fiscal.router)
 
+@app.on_event("startup")
+async def open_async_supabase():
+    instrument_supabase(supabase)
+    instrument_supabase(await get_async_supabase())
+
+@app.on_event("shutdown")
+async def shutdown_async_supabase():
+    await close_async_supabase()
+
 # =========================
 # CORS
 # =========================
@@ -57,8 +74,36 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
+@app.middleware("http")
+async def request_metrics(request: Request, call_next):
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # rota "template" (/jobs/{job_id}) para nao explodir a cardinalidade
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.labels(
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=str(status),
+        ).observe(time.perf_counter() - t0)
+
+def require_internal_key(x_internal_key: Optional[str] = Header(None)):
+    # sem INTERNAL_API_KEY configurada as rotas internas ficam fechadas
+    if not INTERNAL_KEY or not x_internal_key or not hmac.compare_digest(x_internal_key.encode(), INTERNAL_KEY.encode()):
+        raise HTTPException(status_code=403, detail="Proibido")
+
+@app.get("/metrics", dependencies=[Depends(require_internal_key)])
+def metrics():
+    data, content_type = render_latest([queue])
+    return Response(content=data, media_type=content_type)
+
 @app.options("/{path:path}")
 async def preflight_handler(path: str, request: Request):
     return {}
@@ -97,6 +142,10 @@ class PrintJobItem(BaseModel):
 class PrintJobRequest(BaseModel):
     items: List[PrintJobItem]
     sheet_size: str = '30x100'
+    png_profile: Optional[str] = None
+
+class PrintJobBatchRequest(BaseModel):
+    orders: List[PrintJobRequest]
 
 class PrintNoteIn(BaseModel):
     print_id: str
@@ -129,6 +178,15 @@ def current_user(user=Depends(get_current_user)):
 def load_slots(print_id: str):
     return supabase.table("print_slots").select("*").eq("print_id", print_id).execute().data or []
 
+INGESTED_SLOT_FIELDS = ("original_url", "preview_url", "pixel_width", "pixel_height", "content_hash", "trimmed")
+
+def ingested_fields(existing: list, slot_type: str, url: Optional[str]):
+    # Mantem os metadados da normalizacao se a arte do slot nao mudou
+    for e in existing:
+        if e.get("type") == slot_type and url and e.get("url") == url:
+            return {k: e.get(k) for k in INGESTED_SLOT_FIELDS if k in e}
+    return {}
+
 # =========================
 # ROOT
 # =========================
@@ -161,20 +219,69 @@ def save_print_note(data: PrintNoteIn, user=Depends(get_current_user)):
 # =========================
 
 @app.get("/prints")
-def list_prints(user=Depends(get_current_user)):
-    prints = supabase.table("prints").select("*").eq("user_id", user["sub"]).order("created_at", desc=True).execute().data or []
+async def list_prints(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=200),
+    user=Depends(get_current_user),
+):
+    db = await get_async_supabase()
+    q = keyset_page(db.table("prints").select("*").eq("user_id", user["sub"]), cursor, limit)
+    prints, next_cursor = split_page((await q.execute()).data or [], limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    if not prints:
+        return []
+
+    # Um unico select de slots para todos os prints (antes era um por print)
+    slots = (await db.table("print_slots").select("*").in_("print_id", [p["id"] for p in prints]).execute()).data or []
+    by_print: dict[str, list] = {}
+    for s in slots:
+        by_print.setdefault(s["print_id"], []).append(s)
+
     for p in prints:
-        p["slots"] = load_slots(p["id"])
+        p["slots"] = by_print.get(p["id"], [])
     return prints
 
-@app.get("/prints/{print_id}")
-def get_print(print_id: str, user=Depends(get_current_user)):
-    p = supabase.table("prints").select("*").eq("id", print_id).eq("user_id", user["sub"]).single().execute().data
+def fetch_print(print_id: str, user_id: str):
+    p = supabase.table("prints").select("*").eq("id", print_id).eq("user_id", user_id).single().execute().data
     if not p:
         raise HTTPException(status_code=404, detail="Print não encontrado")
     p["slots"] = load_slots(p["id"])
     return p
 
+def fetch_prints(print_ids: List[str], user_id: str) -> Dict[str, dict]:
+    """
+    Varios prints (com slots) em duas queries, indexados pelo id como o
+    chamador mandou; ids alheios/invalidos ficam de fora.
+    """
+    canonical = {}
+    for pid in dict.fromkeys(print_ids):
+        try:
+            canonical[pid] = str(uuid.UUID(pid))
+        except ValueError:
+            continue
+    ids = list(dict.fromkeys(canonical.values()))
+    if not ids:
+        return {}
+
+    prints = supabase.table("prints").select("*").in_("id", ids).eq("user_id", user_id).execute().data or []
+    by_id = {p["id"]: {**p, "slots": []} for p in prints}
+    if by_id:
+        slots = supabase.table("print_slots").select("*").in_("print_id", list(by_id)).execute().data or []
+        for s in slots:
+            by_id[s["print_id"]]["slots"].append(s)
+    return {pid: by_id[c] for pid, c in canonical.items() if c in by_id}
+
+@app.get("/prints/{print_id}")
+async def get_print(print_id: str, user=Depends(get_current_user)):
+    db = await get_async_supabase()
+    p = (await db.table("prints").select("*").eq("id", print_id).eq("user_id", user["sub"]).single().execute()).data
+    if not p:
+        raise HTTPException(status_code=404, detail="Print não encontrado")
+    p["slots"] = (await db.table("print_slots").select("*").eq("print_id", print_id).execute()).data or []
+    return p
+
 @app.post("/prints")
 def create_print(payload: PrintCreate, user=Depends(get_current_user)):
     slots_validated = [Slot(**s) for s in payload.slots]
@@ -199,7 +306,7 @@ def create_print(payload: PrintCreate, user=Depends(get_current_user)):
             "url": s.url,
         }, on_conflict="print_id,type").execute()
 
-    return get_print(print_id, user)
+    return fetch_print(print_id, user["sub"])
 
 @app.patch("/prints/{print_id}")
 def update_print(print_id: str, payload: Dict[str, Any], user=Depends(get_current_user)):
@@ -209,6 +316,7 @@ def update_print(print_id: str, payload: Dict[str, Any], user=Depends(get_curren
 
     slots_validated = [Slot(**s) for s in slots]
 
+    existing = load_slots(print_id)
     supabase.table("print_slots").delete().eq("print_id", print_id).execute()
 
     for s in slots_validated:
@@ -219,9 +327,10 @@ def update_print(print_id: str, payload: Dict[str, Any], user=Depends(get_curren
             "width_cm": s.width_cm,
             "height_cm": s.height_cm,
             "url": s.url,
+            **ingested_fields(existing, s.type, s.url),
         }).execute()
 
-    return get_print(print_id, user)
+    return fetch_print(print_id, user["sub"])
 
 @app.delete("/prints/{print_id}")
 def delete_print(print_id: str, user=Depends(get_current_user)):
@@ -229,33 +338,113 @@ def delete_print(print_id: str, user=Depends(get_current_user)):
     supabase.table("prints").delete().eq("id", print_id).eq("user_id", user["sub"]).execute()
     return {"status": "deleted"}
 
-@app.post("/prints/{print_id}/upload")
-def upload_print_file(
-    print_id: str,
-    file: UploadFile = File(...),
-    type: str = Form(...),
-    width_cm: float = Form(...),
-    height_cm: float = Form(...),
-    user=Depends(get_current_user),
-):
-    content = file.file.read()
-    if not content:
-        raise HTTPException(status_code=400, detail="Arquivo vazio")
-
-    path = f"{user['sub']}/{print_id}/{type}.png"
-    supabase.storage.from_("prints").upload(path, content, {"upsert": "true"})
-    public_url = supabase.storage.from_("prints").get_public_url(path)
+def register_uploaded_slot(print_id: str, slot_type: str, width_cm: float, height_cm: float, user_id: str, path: str):
+    public_url = storage_uploader.public_url("prints", path)
 
     supabase.table("print_slots").upsert({
         "id": str(uuid.uuid4()),
         "print_id": print_id,
-        "type": type,
+        "type": slot_type,
         "width_cm": width_cm,
         "height_cm": height_cm,
         "url": public_url,
+        # derivados da arte anterior saem ate o ingest preencher de novo
+        **{k: None for k in INGESTED_SLOT_FIELDS},
+        "trimmed": False,
     }, on_conflict="print_id,type").execute()
 
-    return {"url": public_url}
+    # Normalizacao (trim + derivados) fica no worker, fora do request
+    # por caminho: a API nao importa o ingest (Pillow) so para enfileirar
+    queue.enqueue("backend.artwork_ingest.ingest_print_slot", print_id, slot_type, user_id, public_url, job_timeout=300)
+
+    return public_url
+
+def upload_path(user_id: str, print_id: str, slot_type: str, fmt: str = "PNG"):
+    if slot_type not in ("front", "back", "extra"):
+        raise HTTPException(status_code=400, detail=f"Tipo inválido: {slot_type}")
+    return f"{user_id}/{print_id}/{slot_type}.{UPLOAD_EXTENSIONS[fmt]}"
+
+@app.post("/prints/{print_id}/upload")
+async def upload_print_file(print_id: str, request: Request, user=Depends(get_current_user)):
+    """
+    multipart: file, type, width_cm, height_cm. O corpo e lido em stream
+    (spool_multipart_upload), nao pelo File()/Form() do FastAPI, que so
+    chamaria o handler depois de receber o upload inteiro.
+    """
+    try:
+        form, tmp_path, size, (fmt, w, h) = await spool_multipart_upload(request)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    try:
+        try:
+            slot_type = form["type"]
+            width_cm, height_cm = float(form["width_cm"]), float(form["height_cm"])
+        except KeyError as e:
+            raise HTTPException(status_code=400, detail=f"Campo obrigatório: {e.args[0]}")
+        except ValueError:
+            raise HTTPException(status_code=400, detail="width_cm/height_cm inválidos")
+        path = upload_path(user["sub"], print_id, slot_type, fmt)
+
+        # sobe do arquivo em disco (stream; resumivel se for grande), sem carregar na memoria
+        await run_in_threadpool(storage_uploader.upload, "prints", path, tmp_path, UPLOAD_MIME_TYPES[fmt])
+    finally:
+        os.unlink(tmp_path)
+
+    public_url = await run_in_threadpool(
+        register_uploaded_slot, print_id, slot_type, width_cm, height_cm, user["sub"], path
+    )
+
+    return {"url": public_url, "bytes": size, "pixel_width": w, "pixel_height": h}
+
+class UploadUrlIn(BaseModel):
+    type: str
+
+class UploadCompleteIn(BaseModel):
+    type: str
+    width_cm: float
+    height_cm: float
+
+@app.post("/prints/{print_id}/upload-url")
+def create_print_upload_url(print_id: str, data: UploadUrlIn, user=Depends(get_current_user)):
+    """Upload direto pro storage: a API so assina, nunca recebe a arte."""
+    path = upload_path(user["sub"], print_id, data.type)
+    signed = supabase.storage.from_("prints").create_signed_upload_url(
+        path, CreateSignedUploadUrlOptions(upsert="true")
+    )
+    return {"signed_url": signed["signed_url"], "token": signed["token"], "path": path}
+
+@app.post("/prints/{print_id}/upload-complete")
+def complete_print_upload(print_id: str, data: UploadCompleteIn, user=Depends(get_current_user)):
+    path = upload_path(user["sub"], print_id, data.type)
+    public_url = storage_uploader.public_url("prints", path)
+
+    # So o cabecalho: valida formato/dimensoes sem baixar a arte inteira
+    def read_head(n: int) -> bytes:
+        r = requests.get(public_url, headers={"Range": f"bytes=0-{n - 1}"}, timeout=20)
+        r.raise_for_status()
+        return r.content[:n]
+
+    try:
+        fmt, w, h = probe_image_range(read_head)
+    except requests.RequestException:
+        raise HTTPException(status_code=400, detail="Arquivo não encontrado no storage")
+    except UploadRejected as e:
+        supabase.storage.from_("prints").remove([path])
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    # a URL assinada e emitida antes de saber o formato: JPEG/WEBP vao para
+    # a extensao certa (move no proprio storage, sem baixar)
+    final_path = upload_path(user["sub"], print_id, data.type, fmt)
+    if final_path != path:
+        bucket = supabase.storage.from_("prints")
+        bucket.remove([final_path])
+        bucket.move(path, final_path)
+        path = final_path
+
+    public_url = register_uploaded_slot(print_id, data.type, data.width_cm, data.height_cm, user["sub"], path)
+
+    return {"url": public_url, "pixel_width": w, "pixel_height": h}
 
 # =========================
 # JOBS
@@ -266,84 +455,93 @@ def build_pieces(print_obj, qty: int):
         {
             "width": s["width_cm"],
             "height": s["height_cm"],
-            "type": s.type,
+            "type": s["type"],
             "print_id": print_obj["id"],
-            "url": s.url,
+            "url": s.get("url"),
+            "preview_url": s.get("preview_url"),
+            "trimmed": bool(s.get("trimmed")),
+            "content_hash": s.get("content_hash"),
         }
         for _ in range(qty)
         for s in print_obj["slots"]
     ]
 
 @app.get("/jobs/history")
-def list_job_history(from_: Optional[str] = None, to: Optional[str] = None, user=Depends(get_current_user)):
-    q = supabase.table("jobs").select("id,status,created_at,finished_at,zip_url,payload").eq("user_id", user["sub"])
+async def list_job_history(
+    response: Response,
+    from_: Optional[str] = None,
+    to: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    user=Depends(get_current_user),
+):
+    db = await get_async_supabase()
+    # sem payload: kits/sheets tem colunas proprias
+    q = db.table("jobs").select("id,status,created_at,finished_at,zip_url,kits,sheets").eq("user_id", user["sub"])
     if from_:
         q = q.gte("created_at", from_)
     if to:
         q = q.lte("created_at", to)
 
-    jobs = q.order("created_at", desc=True).limit(50).execute().data or []
-    if not jobs:
-        return []
-
-    result = []
-    for j in jobs:
-        payload = j.get("payload") or {}
-        kits = payload.get("kits") or 0
-        sheets = payload.get("sheets") or 0
+    jobs, next_cursor = split_page((await keyset_page(q, cursor, limit).execute()).data or [], limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
 
-        result.append({
+    return [
+        {
             "id": j["id"],
             "status": j["status"],
             "created_at": j["created_at"],
             "finished_at": j.get("finished_at"),
             "zip_url": j.get("zip_url"),
-            "file_count": sheets,
-            "print_count": kits,
-        })
-
-    return result
+            "file_count": j.get("sheets") or 0,
+            "print_count": j.get("kits") or 0,
+        }
+        for j in jobs
+    ]
 
 @app.get("/jobs/{job_id}")
-def get_job(job_id: str, user=Depends(get_current_user)):
-    job = supabase.table("jobs").select("*").eq("id", job_id).eq("user_id", user["sub"]).single().execute().data
+async def get_job(job_id: str, user=Depends(get_current_user)):
+    db = await get_async_supabase()
+    # endpoint mais consultado (polling): uma query, sem payload
+    job = (
+        await db.table("jobs")
+        .select("id,status,created_at,finished_at,zip_url,kits,sheets,file_count")
+        .eq("id", job_id)
+        .eq("user_id", user["sub"])
+        .single()
+        .execute()
+    ).data
     if not job:
         raise HTTPException(status_code=404, detail="Job não encontrado")
 
-    payload = job.get("payload") or {}
-    sheets = payload.get("sheets") or 0
-    kits = payload.get("kits") or 0
-
-    files = supabase.table("print_files").select("id").eq("job_id", job_id).execute().data or []
-
     return {
         "id": job["id"],
         "status": job["status"],
         "created_at": job["created_at"],
         "finished_at": job.get("finished_at"),
         "zip_url": job.get("zip_url"),
-        "file_count": len(files),
-        "print_count": sheets or kits,
+        "file_count": job.get("file_count") or 0,
+        "print_count": job.get("sheets") or job.get("kits") or 0,
     }
 
 @app.get("/jobs/{job_id}/files")
-def get_job_files(job_id: str, user=Depends(get_current_user)):
+async def get_job_files(job_id: str, user=Depends(get_current_user)):
     uuid.UUID(job_id)
 
-    job = supabase.table("jobs").select("id").eq("id", job_id).eq("user_id", user["sub"]).single().execute().data
+    db = await get_async_supabase()
+    job = (await db.table("jobs").select("id").eq("id", job_id).eq("user_id", user["sub"]).single().execute()).data
     if not job:
         raise HTTPException(status_code=404, detail="Job não encontrado")
 
     files = (
-        supabase
+        await db
         .table("print_files")
         .select("id, public_url, page_index, created_at, preview")
         .eq("job_id", job_id)
         .order("page_index")
         .execute()
-        .data
-        or []
-    )
+    ).data or []
 
     return [
         {
@@ -356,40 +554,174 @@ def get_job_files(job_id: str, user=Depends(get_current_user)):
         for f in files
     ]
 
-@app.post("/print-jobs")
-def create_print_job(payload: PrintJobRequest, user=Depends(get_current_user)):
-    if not payload.items:
+@app.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str, user=Depends(get_current_user)):
+    """
+    Job ainda na fila/aguardando confirmacao: cancela direto (o worker
+    ignora ao pegar). Em processamento: marca "cancelling" e o worker para
+    entre folhas, gravando "cancelled".
+    """
+    try:
+        uuid.UUID(job_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+
+    waiting = (
+        supabase.table("jobs")
+        .update({"status": "cancelled", "finished_at": datetime.now(timezone.utc).isoformat()})
+        .eq("id", job_id)
+        .eq("user_id", user["sub"])
+        .in_("status", ["preview", "preview_done", "queued"])
+        .execute()
+    )
+    if waiting.data:
+        job = waiting.data[0]
+        if (job.get("payload") or {}).get("gang"):
+            close_gang_members(job_id, {"status": "cancelled", "finished_at": job["finished_at"]})
+        return {"status": "cancelled"}
+
+    running = (
+        supabase.table("jobs")
+        .update({"status": "cancelling"})
+        .eq("id", job_id)
+        .eq("user_id", user["sub"])
+        .in_("status", ["processing", "processing_preview"])
+        .execute()
+    )
+    if running.data:
+        return {"status": "cancelling"}
+
+    raise HTTPException(status_code=409, detail="Job não pode ser cancelado")
+
+class ProfileFlagIn(BaseModel):
+    enabled: bool = True
+
+@app.post("/jobs/{job_id}/profile", dependencies=[Depends(require_internal_key)])
+def set_job_profile(job_id: str, data: ProfileFlagIn):
+    """Liga/desliga o profiler para as proximas execucoes do job (uso interno)."""
+    uuid.UUID(job_id)
+
+    job = supabase.table("jobs").select("id,payload").eq("id", job_id).single().execute().data
+    if not job:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+
+    payload = job.get("payload") or {}
+    payload["profile"] = data.enabled
+    supabase.table("jobs").update({"payload": payload}).eq("id", job_id).execute()
+
+    return {"job_id": job_id, "profile": data.enabled}
+
+@app.get("/sheet-profiles")
+def list_sheet_profiles(user=Depends(get_current_user)):
+    """Tamanhos de folha aceitos em sheet_size (embutidos + config + tabela)."""
+    return list(sheet_profiles().values())
+
+def build_print_job(order: PrintJobRequest, prints: Dict[str, dict], user_id: str) -> dict:
+    """Linha de jobs (status preview) de um pedido; HTTPException se invalido."""
+    if not order.items:
         raise HTTPException(status_code=400, detail="Nenhum item enviado")
 
-    total_kits = sum(max(i.qty, 0) for i in payload.items)
+    try:
+        png_profile = resolve_profile(order.png_profile)
+        sheet_profile = resolve_sheet_profile(order.sheet_size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    total_kits = sum(max(i.qty, 0) for i in order.items)
 
     pieces = []
-    for item in payload.items:
-        print_obj = get_print(item.print_id, user)
+    for item in order.items:
+        print_obj = prints.get(item.print_id)
+        if not print_obj:
+            raise HTTPException(status_code=404, detail="Print não encontrado")
         pieces.extend(build_pieces(print_obj, item.qty))
 
     if not pieces:
         raise HTTPException(status_code=400, detail="Nenhuma peça gerada")
 
-    job_id = str(uuid.uuid4())
-
-    supabase.table("jobs").insert({
-        "id": job_id,
-        "user_id": user["sub"],
+    return {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
         "status": "preview",
+        "kits": total_kits,
         "payload": {
-            "items": [i.dict() for i in payload.items],
+            "items": [i.dict() for i in order.items],
             "pieces": pieces,
             "kits": total_kits,
             "sheets": None,
-            "sheet_size": payload.sheet_size,
+            "sheet_size": sheet_profile["name"],
+            # congelado: previa e final saem com o mesmo perfil
+            "sheet_profile": sheet_profile,
+            "png_profile": png_profile,
         },
         "created_at": datetime.now(timezone.utc).isoformat(),
-    }).execute()
+    }
 
-    queue.enqueue(process_render, job_id, preview=True, job_timeout=600)
+@app.post("/print-jobs")
+def create_print_job(payload: PrintJobRequest, user=Depends(get_current_user)):
+    prints = fetch_prints([i.print_id for i in payload.items], user["sub"])
+    job = build_print_job(payload, prints, user["sub"])
+
+    supabase.table("jobs").insert(job).execute()
+
+    enqueue_render(queue, job["id"], preview=True)
+
+    return {"job_id": job["id"], "total_kits": job["kits"]}
+
+PRINT_JOB_BATCH_MAX = int(os.getenv("PRINT_JOB_BATCH_MAX", "200"))
+
+@app.post("/print-jobs/batch")
+def create_print_jobs_batch(payload: PrintJobBatchRequest, user=Depends(get_current_user)):
+    """
+    Varios pedidos numa requisicao (integracao com ERP): prints/slots de
+    todos em duas queries, um insert com todas as linhas e um pipeline no
+    Redis. Pedido invalido volta com o erro no seu indice, sem derrubar os
+    demais.
+    """
+    if not payload.orders:
+        raise HTTPException(status_code=400, detail="Nenhum pedido enviado")
+    if len(payload.orders) > PRINT_JOB_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"Máximo de {PRINT_JOB_BATCH_MAX} pedidos por lote")
+
+    prints = fetch_prints([i.print_id for o in payload.orders for i in o.items], user["sub"])
+
+    rows, results = [], []
+    for index, order in enumerate(payload.orders):
+        try:
+            job = build_print_job(order, prints, user["sub"])
+        except HTTPException as e:
+            results.append({"index": index, "error": e.detail, "status_code": e.status_code})
+            continue
+        rows.append(job)
+        results.append({"index": index, "job_id": job["id"], "total_kits": job["kits"]})
+
+    if rows:
+        supabase.table("jobs").insert(rows).execute()
+        enqueue_renders(queue, [job["id"] for job in rows], preview=True)
 
-    return {"job_id": job_id, "total_kits": total_kits}
+    return {"created": len(rows), "jobs": results}
+
+def consume_sheets(user_id: str, sheets: int, job_id: str):
+    """Consome o plano pelas folhas do job (idempotente por job_id)."""
+    usage = get_usage(supabase, user_id)
+
+    if usage["plan"] == "free":
+        if usage["status"] == "blocked":
+            raise HTTPException(
+                status_code=402,
+                detail="Limite diário do plano FREE atingido"
+            )
+        consume_usage(supabase, user_id, sheets, job_id=job_id)
+    else:
+        try:
+            check_and_consume_limits(
+                supabase,
+                user_id,
+                sheets,
+                job_id=job_id
+            )
+        except LimitExceeded as e:
+            raise HTTPException(status_code=402, detail=str(e))
 
 @app.post("/print-jobs/{job_id}/confirm")
 def confirm_print_job(job_id: str, user=Depends(get_current_user)):
@@ -397,7 +729,7 @@ def confirm_print_job(job_id: str, user=Depends(get_current_user)):
 
     updated = (
         supabase.table("jobs")
-        .update({"status": "confirming"})
+        .update({"status": "confirming", "heartbeat_at": datetime.now(timezone.utc).isoformat()})
         .eq("id", job_id)
         .eq("status", "preview_done")
         .execute()
@@ -416,32 +748,11 @@ def confirm_print_job(job_id: str, user=Depends(get_current_user)):
         .data
     )
 
-    sheets = (job.get("payload") or {}).get("sheets") or 0
+    sheets = job.get("sheets") or 0
     if sheets <= 0:
         raise HTTPException(status_code=400, detail="Nenhum kit no job")
 
-    # =========================
-    # USAGE / PLANO
-    # =========================
-    usage = get_usage(supabase, user["sub"])
-
-    if usage["plan"] == "free":
-        if usage["status"] == "blocked":
-            raise HTTPException(
-                status_code=402,
-                detail="Limite diário do plano FREE atingido"
-            )
-        consume_usage(supabase, user["sub"], sheets, job_id=job_id)
-    else:
-        try:
-            check_and_consume_limits(
-                supabase,
-                user["sub"],
-                sheets,
-                job_id=job_id
-            )
-        except LimitExceeded as e:
-            raise HTTPException(status_code=402, detail=str(e))
+    consume_sheets(user["sub"], sheets, job_id)
 
     # =========================
     # SEGUE O JOB
@@ -450,10 +761,100 @@ def confirm_print_job(job_id: str, user=Depends(get_current_user)):
         {"status": "queued"}
     ).eq("id", job_id).execute()
 
-    queue.enqueue(process_render, job_id, preview=False, job_timeout=600)
+    enqueue_render(queue, job_id, preview=False)
 
     return {"status": "confirmed", "sheets": sheets}
 
+class GangConfirmIn(BaseModel):
+    job_ids: List[str]
+
+GANG_MAX_JOBS = int(os.getenv("GANG_MAX_JOBS", "50"))
+
+@app.post("/print-jobs/gang")
+def confirm_gang_job(data: GangConfirmIn, user=Depends(get_current_user)):
+    """
+    Confirma varios pedidos com previa pronta (mesmo tamanho de folha e
+    perfil PNG) numa producao so: as pecas de todos sao empacotadas juntas,
+    entao a sobra da ultima folha de um pedido e ocupada pelos outros. O
+    plano e consumido pelas folhas do gang, nao pela soma dos pedidos.
+    """
+    job_ids = list(dict.fromkeys(data.job_ids))
+    for job_id in job_ids:
+        uuid.UUID(job_id)
+
+    if len(job_ids) < 2:
+        raise HTTPException(status_code=400, detail="Selecione ao menos dois pedidos")
+    if len(job_ids) > GANG_MAX_JOBS:
+        raise HTTPException(status_code=400, detail=f"Máximo de {GANG_MAX_JOBS} pedidos por gang")
+
+    # mesmo claim do confirm individual, para todos de uma vez
+    claimed = (
+        supabase.table("jobs")
+        .update({"status": "confirming", "heartbeat_at": datetime.now(timezone.utc).isoformat()})
+        .in_("id", job_ids)
+        .eq("user_id", user["sub"])
+        .eq("status", "preview_done")
+        .execute()
+        .data
+    ) or []
+
+    def release():
+        if claimed:
+            supabase.table("jobs").update({"status": "preview_done"}).in_(
+                "id", [j["id"] for j in claimed]
+            ).eq("status", "confirming").execute()
+
+    if len(claimed) != len(job_ids):
+        release()
+        raise HTTPException(status_code=409, detail="Algum pedido já foi confirmado ou está sem prévia")
+
+    payloads = [j.get("payload") or {} for j in claimed]
+    member_profiles = [job_sheet_profile(p) for p in payloads]
+    png_profiles = {p.get("png_profile") for p in payloads}
+    if any(sp != member_profiles[0] for sp in member_profiles) or len(png_profiles) > 1:
+        release()
+        raise HTTPException(status_code=400, detail="Pedidos com tamanho de folha ou perfil PNG diferentes")
+
+    sheet_profile = member_profiles[0]
+    pieces = [{**piece, "job_id": j["id"]} for j, p in zip(claimed, payloads) for piece in p.get("pieces") or []]
+    sheets = count_sheets(pieces, sheet_profile)
+    separate = sum(j.get("sheets") or 0 for j in claimed)
+    kits = sum(j.get("kits") or 0 for j in claimed)
+
+    gang_id = str(uuid.uuid4())
+    try:
+        consume_sheets(user["sub"], sheets, gang_id)
+    except HTTPException:
+        release()
+        raise
+
+    supabase.table("jobs").insert({
+        "id": gang_id,
+        "user_id": user["sub"],
+        "status": "queued",
+        "kits": kits,
+        "sheets": sheets,
+        "payload": {
+            "pieces": pieces,
+            "kits": kits,
+            "sheets": sheets,
+            "sheet_size": sheet_profile["name"],
+            "sheet_profile": sheet_profile,
+            "png_profile": png_profiles.pop(),
+            "gang": {"jobs": [j["id"] for j in claimed], "sheets_separate": separate},
+        },
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }).execute()
+
+    supabase.table("jobs").update({"status": "ganged", "gang_id": gang_id}).in_(
+        "id", job_ids
+    ).eq("status", "confirming").execute()
+
+    enqueue_render(queue, gang_id, preview=False)
+
+    print(f"🧩 Gang {gang_id}: {len(job_ids)} pedidos, {sheets} folhas (separados: {separate})")
+    return {"gang_id": gang_id, "jobs": job_ids, "sheets": sheets, "sheets_separate": separate}
+
 
 # =========================
 # STATS 
@@ -471,7 +872,8 @@ def get_print_stats(
 
     jobs = (
         supabase.table("jobs")
-        .select("id,payload,status,created_at")
+        # so os items do payload (sem pieces) + contador de arquivos
+        .select("id,status,created_at,file_count,gang_id,items:payload->items")
         .eq("user_id", user["sub"])
         .gte("created_at", from_dt.isoformat())
         .lte("created_at", to_dt.isoformat())
@@ -485,21 +887,11 @@ def get_print_stats(
     total_prints = 0
 
     for j in jobs:
-        payload = j.get("payload") or {}
-        items = payload.get("items") or []
-        sheets = int(payload.get("sheets") or 0)
-        status = j.get("status")
-
-        if status == "done":
-            files = (
-                supabase.table("print_files")
-                .select("id")
-                .eq("job_id", j["id"])
-                .execute()
-                .data
-                or []
-            )
-            total_files += len(files)
+        items = j.get("items") or []
+
+        # pedido de um gang: as folhas contam uma vez, no job gang
+        if j.get("status") == "done" and not j.get("gang_id"):
+            total_files += j.get("file_count") or 0
 
         for item in items:
             pid = item.get("print_id")
@@ -548,8 +940,8 @@ def get_print_stats(
 # =========================
 
 @app.get("/me/usage")
-def get_my_usage(user=Depends(get_current_user)):
-    usage = get_usage(supabase, user["sub"])
+async def get_my_usage(user=Depends(get_current_user)):
+    usage = await aget_usage(await get_async_supabase(), user["sub"])
     return {
         "plan": usage["plan"],
         "used": usage["used"],
@@ -0,0 +1,185 @@
+# backend/metrics.py
+#
+# Metricas Prometheus da API e dos workers.
+#
+# API: GET /metrics (exige X-Internal-Key = INTERNAL_API_KEY; sem a chave configurada, 403).
+# Worker: METRICS_PORT=9100 sobe um servidor HTTP ao lado do worker. Como o RQ
+# faz fork por job (e o modo simple recicla o processo de trabalho), defina
+# PROMETHEUS_MULTIPROC_DIR (diretorio vazio, gravavel) para que as metricas
+# dos processos filhos sobrevivam ao fim deles.
+
+import os
+import time
+import resource
+
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    CONTENT_TYPE_LATEST,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+    REGISTRY,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+MULTIPROC = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "pvty_http_request_seconds",
+    "Latencia das rotas da API",
+    ["method", "route", "status"],
+)
+
+SUPABASE_REQUEST_SECONDS = Histogram(
+    "pvty_supabase_request_seconds",
+    "Latencia das chamadas ao Supabase (PostgREST/Storage)",
+    ["service", "method", "status"],
+)
+
+RENDER_JOB_SECONDS = Histogram(
+    "pvty_render_job_seconds",
+    "Duracao total de process_render",
+    ["preview", "status"],
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 900),
+)
+
+RENDER_STAGE_SECONDS = Histogram(
+    "pvty_render_stage_seconds",
+    "Tempo por etapa do render (soma das threads)",
+    ["stage"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 120, 300),
+)
+
+RENDER_SHEETS = Counter(
+    "pvty_render_sheets_total",
+    "Folhas entregues por origem",
+    ["source"],
+)
+
+IMAGE_CACHE = Counter(
+    "pvty_image_cache_total",
+    "Consultas ao _IMAGE_CACHE do render_engine (hit, store = mmap local, miss = decode; evicted = descartada pelo LRU)",
+    ["result"],
+)
+
+MAX_RSS_BYTES = Gauge(
+    "pvty_process_max_rss_bytes",
+    "Pico de memoria residente do processo",
+    multiprocess_mode="max",
+)
+
+
+def record_max_rss():
+    # ru_maxrss vem em KB no Linux
+    MAX_RSS_BYTES.set(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+
+
+def record_job_timing(summary: dict, seconds: float, preview: bool, status: str):
+    RENDER_JOB_SECONDS.labels(preview=str(preview).lower(), status=status).observe(seconds)
+    for stage, s in (summary.get("stages") or {}).items():
+        RENDER_STAGE_SECONDS.labels(stage=stage).observe(s["ms"] / 1000)
+    record_max_rss()
+
+
+# =========================
+# SUPABASE (httpx event hooks)
+# =========================
+
+def _service(request) -> str:
+    path = request.url.path
+    if "/storage/" in path:
+        return "storage"
+    if "/rest/" in path:
+        return "postgrest"
+    return "other"
+
+
+def _on_request(request):
+    request.extensions["pvty_t0"] = time.perf_counter()
+
+
+def _on_response(response):
+    t0 = response.request.extensions.get("pvty_t0")
+    if t0 is not None:
+        SUPABASE_REQUEST_SECONDS.labels(
+            service=_service(response.request),
+            method=response.request.method,
+            status=str(response.status_code),
+        ).observe(time.perf_counter() - t0)
+
+
+async def _on_request_async(request):
+    _on_request(request)
+
+
+async def _on_response_async(response):
+    _on_response(response)
+
+
+def instrument_httpx(client):
+    """Conta/mede cada request de um httpx.Client ou AsyncClient."""
+    hooks = client.event_hooks
+    if hasattr(client, "aclose"):
+        hooks["request"].append(_on_request_async)
+        hooks["response"].append(_on_response_async)
+    else:
+        hooks["request"].append(_on_request)
+        hooks["response"].append(_on_response)
+    client.event_hooks = hooks
+
+
+def instrument_supabase(client):
+    # no cliente async o PostgREST e o Storage compartilham o mesmo httpx
+    sessions = {id(s): s for s in (client.postgrest.session, client.storage.session)}
+    for session in sessions.values():
+        instrument_httpx(session)
+
+
+# =========================
+# FILAS (RQ)
+# =========================
+
+class QueueDepthCollector:
+    """Le o tamanho das filas no momento do scrape (sem processo extra)."""
+
+    def __init__(self, queues):
+        self.queues = queues
+
+    def collect(self):
+        g = GaugeMetricFamily("pvty_rq_queue_depth", "Jobs aguardando por fila RQ", labels=["queue"])
+        for q in self.queues:
+            try:
+                g.add_metric([q.name], q.count)
+            except Exception:
+                continue
+        yield g
+
+
+def _registry(queues=None) -> CollectorRegistry:
+    if MULTIPROC:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+
+    if queues and not getattr(registry, "_pvty_queues", False):
+        registry.register(QueueDepthCollector(queues))
+        registry._pvty_queues = True
+
+    return registry
+
+
+def render_latest(queues=None) -> tuple[bytes, str]:
+    record_max_rss()
+    return generate_latest(_registry(queues)), CONTENT_TYPE_LATEST
+
+
+def start_worker_metrics_server(queues):
+    port = os.getenv("METRICS_PORT")
+    if not port:
+        return
+    start_http_server(int(port), registry=_registry(queues))
+    print(f"📈 Métricas do worker em :{port}/metrics")
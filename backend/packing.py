@@ -0,0 +1,161 @@
+# backend/packing.py
+#
+# Empacotamento das pecas nas folhas (prateleiras), so geometria: sem
+# Pillow, para a API contar folhas (confirmacao de gang) sem carregar o
+# render engine.
+
+from backend.print_utils import cm_to_px
+from backend.print_config import SPACING_CM
+
+# vao padrao no DPI padrao (os perfis passam o proprio spacing)
+SPACING_PX = cm_to_px(SPACING_CM)
+
+
+class Shelf:
+    def __init__(self, y):
+        self.y = y
+        self.height = 0
+        self.used_width = 0
+
+
+class Sheet:
+    def __init__(self):
+        self.shelves = []
+        self.used_height = 0
+        self.items = []
+
+
+def pack_items_hybrid(raw_items, sheet_width, sheet_height, spacing=SPACING_PX):
+    items = [{**i} for i in raw_items]
+    SHEET_AREA = sheet_width * sheet_height
+
+    large, medium, small = [], [], []
+
+    for i in items:
+        area = i["w"] * i["h"]
+        if area >= 0.25 * SHEET_AREA:
+            large.append(i)
+        elif area >= 0.05 * SHEET_AREA:
+            medium.append(i)
+        else:
+            small.append(i)
+
+    for group in (large, medium, small):
+        group.sort(key=lambda i: max(i["w"], i["h"]), reverse=True)
+
+    sheets: list[Sheet] = []
+
+    def place(item):
+        for sheet in sheets:
+            for shelf in sheet.shelves:
+                for w, h, r in [(item["w"], item["h"], False), (item["h"], item["w"], True)]:
+                    if shelf.used_width + w + spacing <= sheet_width and shelf.y + h + spacing <= sheet_height:
+                        item.update({"x": shelf.used_width, "y": shelf.y, "rotated": r})
+                        shelf.used_width += w + spacing
+                        shelf.height = max(shelf.height, h + spacing)
+                        sheet.items.append(item)
+                        return True
+        return False
+
+    for group in (large, medium, small):
+        for item in group:
+            if place(item):
+                continue
+
+            placed = False
+            for sheet in sheets:
+                for w, h, r in [(item["w"], item["h"], False), (item["h"], item["w"], True)]:
+                    if sheet.used_height + h + spacing <= sheet_height:
+                        shelf = Shelf(sheet.used_height)
+                        shelf.used_width = w + spacing
+                        shelf.height = h + spacing
+                        item.update({"x": 0, "y": shelf.y, "rotated": r})
+                        sheet.shelves.append(shelf)
+                        sheet.used_height += shelf.height
+                        sheet.items.append(item)
+                        placed = True
+                        break
+                if placed:
+                    break
+
+            if placed:
+                continue
+
+            sheet = Sheet()
+            for w, h, r in [(item["w"], item["h"], False), (item["h"], item["w"], True)]:
+                if h + spacing <= sheet_height:
+                    shelf = Shelf(0)
+                    shelf.used_width = w + spacing
+                    shelf.height = h + spacing
+                    item.update({"x": 0, "y": 0, "rotated": r})
+                    sheet.shelves.append(shelf)
+                    sheet.used_height = shelf.height
+                    sheet.items.append(item)
+                    sheets.append(sheet)
+                    placed = True
+                    break
+
+            if not placed:
+                raise ValueError(f"Item não coube: {item}")
+
+    return sheets
+
+
+def piece_items(pieces: list[dict], dpi: int) -> list[dict]:
+    items = []
+    for p in pieces:
+        item = {"print_url": p["url"], "w": cm_to_px(p["width"], dpi), "h": cm_to_px(p["height"], dpi)}
+        # job gang: cada peca lembra de qual pedido veio
+        if p.get("job_id"):
+            item["job_id"] = p["job_id"]
+        items.append(item)
+    return items
+
+
+def pack_pieces(pieces: list[dict], profile: dict) -> tuple[list[Sheet], int, int]:
+    """
+    Empacota na area util da folha (sem o bleed das bordas), em px do DPI
+    do perfil. Retorna as folhas e o tamanho maximo de uma folha.
+    """
+    dpi = profile["dpi"]
+    sheet_w, sheet_h = cm_to_px(profile["width_cm"], dpi), cm_to_px(profile["length_cm"], dpi)
+    bleed = cm_to_px(profile["bleed_cm"], dpi)
+
+    sheets = pack_items_hybrid(
+        piece_items(pieces, dpi),
+        sheet_w - 2 * bleed,
+        sheet_h - 2 * bleed,
+        spacing=cm_to_px(profile["spacing_cm"], dpi),
+    )
+    if bleed:
+        for sheet in sheets:
+            for item in sheet.items:
+                item["x"] += bleed
+                item["y"] += bleed
+    return sheets, sheet_w, sheet_h
+
+
+def count_sheets(pieces: list[dict], profile: dict) -> int:
+    """So o empacotamento (sem baixar arte): quantas folhas as pecas ocupam."""
+    return len(pack_pieces(pieces, profile)[0])
+
+
+def used_length(sheet: Sheet, sheet_h: int, tail: int) -> int:
+    """Rolo: ate o fim da peca mais baixa + a borda final (bleed ou espacamento)."""
+    bottom = max(i["y"] + (i["w"] if i.get("rotated") else i["h"]) for i in sheet.items)
+    return min(bottom + tail, sheet_h)
+
+
+def sheet_placements(sheet: Sheet) -> list[dict]:
+    return [
+        {
+            "job_id": i.get("job_id"),
+            "print_url": i["print_url"],
+            "x": i["x"],
+            "y": i["y"],
+            "w": i["w"],
+            "h": i["h"],
+            "rotated": bool(i.get("rotated")),
+        }
+        for i in sheet.items
+    ]
@@ -0,0 +1,49 @@
+# backend/pagination.py
+#
+# Paginacao keyset em (created_at desc, id desc): o custo de cada pagina
+# nao cresce com o historico da conta (sem OFFSET). As listas continuam
+# sendo o corpo da resposta; o cursor da proxima pagina vai no header
+# X-Next-Cursor (ausente na ultima pagina).
+
+import json
+import uuid
+import base64
+from datetime import datetime
+from fastapi import HTTPException
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(row: dict) -> str:
+    raw = json.dumps([row["created_at"], row["id"]], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[str, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        # validados: os valores entram num filtro or=() do PostgREST
+        datetime.fromisoformat(created_at)
+        uuid.UUID(row_id)
+    except (ValueError, TypeError, AttributeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return created_at, row_id
+
+
+def keyset_page(q, cursor: str | None, limit: int):
+    """Aplica ordem + filtro do cursor; busca limit+1 para saber se ha mais."""
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        q = q.or_(
+            f'created_at.lt."{created_at}",'
+            f'and(created_at.eq."{created_at}",id.lt."{row_id}")'
+        )
+    return q.order("created_at", desc=True).order("id", desc=True).limit(limit + 1)
+
+
+def split_page(rows: list[dict], limit: int) -> tuple[list[dict], str | None]:
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1])
@@ -0,0 +1,238 @@
+# backend/png_encoder.py
+import io
+import os
+import time
+import zlib
+import threading
+import struct
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageChops
+
+from backend.print_config import PNG_PROFILES, DEFAULT_PNG_PROFILE, PREVIEW_PNG_PROFILE, resolve_profile  # noqa: F401
+
+# =========================
+# PERFIS DE ENCODING
+# =========================
+# Definidos em print_config (sem Pillow: a API valida o perfil sem
+# importar o encoder). fast/balanced usam o encoder paralelo abaixo (zlib
+# libera o GIL, entao blocos independentes comprimem em paralelo). small
+# usa o encoder do Pillow com optimize e tenta paleta sem perda para arte
+# de poucas cores.
+
+PNG_ENCODE_THREADS = int(os.getenv("PNG_ENCODE_THREADS", str(os.cpu_count() or 1)))
+# com uma CPU o encoder paralelo nao ganha nada: fast/balanced vao pelo Pillow
+PNG_PARALLEL = PNG_ENCODE_THREADS > 1
+ROWS_PER_BLOCK = 256
+IDAT_MAX = 1024 * 1024
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+_FILTER_BYTES = {"none": b"\x00", "sub": b"\x01", "up": b"\x02"}
+_ADLER_BASE = 65521
+
+_encode_pool: ThreadPoolExecutor | None = None
+_encode_pool_lock = threading.Lock()
+
+
+def _write_chunk(out, tag: bytes, *pieces):
+    """Chunk PNG escrito direto no destino; o CRC e acumulado pedaco a pedaco."""
+    crc = zlib.crc32(tag)
+    for p in pieces:
+        crc = zlib.crc32(p, crc)
+    out.write(struct.pack(">I", sum(len(p) for p in pieces)))
+    out.write(tag)
+    for p in pieces:
+        out.write(p)
+    out.write(struct.pack(">I", crc))
+
+
+class _IdatWriter:
+    """
+    Reparte o stream zlib em chunks IDAT de `size` bytes conforme os
+    pedacos chegam, com memoryviews, sem concatenar; cada pedaco sai da
+    fila assim que seu chunk e escrito.
+    """
+
+    def __init__(self, out, size: int):
+        self.out = out
+        self.size = size
+        self.pending = deque()
+        self.buffered = 0
+
+    def append(self, piece):
+        self.pending.append(memoryview(piece))
+        self.buffered += len(piece)
+        while self.buffered >= self.size:
+            self._write(self.size)
+
+    def close(self):
+        if self.buffered:
+            self._write(self.buffered)
+
+    def _write(self, n: int):
+        group, filled = [], 0
+        while filled < n:
+            view = self.pending[0]
+            take = min(n - filled, len(view))
+            group.append(view[:take])
+            filled += take
+            if take == len(view):
+                self.pending.popleft()
+            else:
+                self.pending[0] = view[take:]
+        self.buffered -= n
+        _write_chunk(self.out, b"IDAT", *group)
+
+
+def _adler32_combine(adler1: int, adler2: int, len2: int) -> int:
+    # Porte do adler32_combine do zlib (nao exposto pelo modulo zlib do Python)
+    rem = len2 % _ADLER_BASE
+    sum1 = adler1 & 0xFFFF
+    sum2 = (rem * sum1) % _ADLER_BASE
+    sum1 += (adler2 & 0xFFFF) + _ADLER_BASE - 1
+    sum2 += ((adler1 >> 16) & 0xFFFF) + ((adler2 >> 16) & 0xFFFF) + _ADLER_BASE - rem
+    if sum1 >= _ADLER_BASE:
+        sum1 -= _ADLER_BASE
+    if sum1 >= _ADLER_BASE:
+        sum1 -= _ADLER_BASE
+    if sum2 >= (_ADLER_BASE << 1):
+        sum2 -= (_ADLER_BASE << 1)
+    if sum2 >= _ADLER_BASE:
+        sum2 -= _ADLER_BASE
+    return sum1 | (sum2 << 16)
+
+
+def _filtered_band(img: Image.Image, top: int, rows: int, strategy: str) -> Image.Image:
+    """
+    Faixa [top, top + rows) ja filtrada. Filtros PNG Sub/Up para RGBA 8 bits
+    sao exatamente a subtracao modulo 256 com a imagem deslocada 1 pixel
+    para a direita/para baixo; o crop deslocado traz a ultima linha da faixa
+    anterior como contexto do Up (zeros acima da primeira).
+    """
+    w = img.size[0]
+    band = img.crop((0, top, w, top + rows))
+    if strategy == "up":
+        return ImageChops.subtract_modulo(band, img.crop((0, top - 1, w, top + rows - 1)))
+    if strategy == "sub":
+        return ImageChops.subtract_modulo(band, img.crop((-1, top, w - 1, top + rows)))
+    return band
+
+
+def _compress_block(img: Image.Image, top: int, rows: int, strategy: str, level: int, last: bool):
+    # Filtro e tobytes so desta faixa: o pico de memoria fica em uma faixa
+    # por thread, nunca uma copia da folha inteira
+    raw = memoryview(_filtered_band(img, top, rows, strategy).tobytes())
+    stride = len(raw) // rows
+    filter_byte = _FILTER_BYTES[strategy]
+    parts = []
+    for r in range(rows):
+        parts.append(filter_byte)
+        parts.append(raw[r * stride:(r + 1) * stride])
+    data = b"".join(parts)
+    del parts, raw
+
+    c = zlib.compressobj(level, zlib.DEFLATED, -15)
+    out = c.compress(data) + c.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+    return out, zlib.adler32(data), len(data)
+
+
+def _get_encode_pool() -> ThreadPoolExecutor:
+    # threads de render concorrentes: um pool so por processo
+    global _encode_pool
+    if _encode_pool is None:
+        with _encode_pool_lock:
+            if _encode_pool is None:
+                _encode_pool = ThreadPoolExecutor(max_workers=PNG_ENCODE_THREADS)
+    return _encode_pool
+
+
+def _encode_parallel(img: Image.Image, out, level: int, strategy: str, dpi: int | None):
+    w, h = img.size
+    # as threads so leem a imagem: carrega antes de repartir
+    img.load()
+
+    pool = _get_encode_pool()
+
+    starts = list(range(0, h, ROWS_PER_BLOCK))
+    futures = [
+        pool.submit(_compress_block, img, top, min(ROWS_PER_BLOCK, h - top), strategy, level, i == len(starts) - 1)
+        for i, top in enumerate(starts)
+    ]
+
+    out.write(_PNG_SIGNATURE)
+    _write_chunk(out, b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 6, 0, 0, 0))
+    if dpi:
+        ppm = round(dpi / 0.0254)
+        _write_chunk(out, b"pHYs", struct.pack(">IIB", ppm, ppm, 1))
+
+    # cabecalho zlib (CM=8, CINFO=7) + blocos deflate + adler32, sem
+    # concatenar: cada bloco vai para os IDAT assim que fica pronto, em ordem
+    idat = _IdatWriter(out, IDAT_MAX)
+    idat.append(b"\x78\x01")
+    adler = 1
+    for i, f in enumerate(futures):
+        block, block_adler, block_len = f.result()
+        futures[i] = None
+        adler = _adler32_combine(adler, block_adler, block_len)
+        idat.append(block)
+        del block
+    idat.append(struct.pack(">I", adler))
+    idat.close()
+    _write_chunk(out, b"IEND")
+
+
+def _lossless_palette(img: Image.Image) -> Image.Image | None:
+    # So vira paleta se a arte tiver <= 256 cores e a conversao for exata
+    if img.getcolors(256) is None:
+        return None
+
+    pal = img.quantize(colors=256, method=Image.Quantize.FASTOCTREE)
+    if ImageChops.difference(pal.convert("RGBA"), img).getbbox():
+        return None
+    return pal
+
+
+def _encode_pillow(img: Image.Image, out, level: int, quantize: bool, dpi: int | None):
+    if quantize:
+        img = _lossless_palette(img) or img
+
+    params = {"format": "PNG", "compress_level": level, "optimize": level >= 9}
+    if dpi:
+        params["dpi"] = (dpi, dpi)
+    img.save(out, **params)
+
+
+def encode_png_to(img: Image.Image, out, profile: str | None = None, dpi: int | None = None) -> dict:
+    """
+    Codifica a folha RGBA no perfil pedido direto em `out` (arquivo ou
+    BytesIO), sem montar o PNG inteiro em memoria antes.
+    Retorna stats com tempo e tamanho, para registrar no job.
+    """
+    name = resolve_profile(profile)
+    cfg = PNG_PROFILES[name]
+
+    if img.mode != "RGBA":
+        img = img.convert("RGBA")
+
+    t0 = time.perf_counter()
+    start = out.tell()
+    if cfg["parallel"] and PNG_PARALLEL:
+        _encode_parallel(img, out, cfg["compress_level"], cfg["filter"], dpi)
+    else:
+        _encode_pillow(img, out, cfg["compress_level"], cfg["quantize"], dpi)
+
+    return {
+        "profile": name,
+        "ms": round((time.perf_counter() - t0) * 1000, 1),
+        "bytes": out.tell() - start,
+    }
+
+
+def encode_png(img: Image.Image, profile: str | None = None, dpi: int | None = None):
+    """
+    Retorna (buffer, stats). O buffer e um memoryview sobre o BytesIO
+    (getbuffer, sem a copia do getvalue); upload aceita direto.
+    """
+    out = io.BytesIO()
+    stats = encode_png_to(img, out, profile, dpi)
+    return out.getbuffer(), stats
@@ -1,15 +1,31 @@
 # backend/print_config.py
+import os
 
 DPI = 300
-PX_PER_CM = DPI / 2.54
+# Previas (com marca d'agua) so sao vistas na tela
+PREVIEW_DPI = int(os.getenv("PREVIEW_DPI", "100"))
 
-SHEET_WIDTH_CM = 57.0
-SHEET_HEIGHT_CM = 100.0
+# Padroes dos perfis de folha (tamanhos e DPI por perfil: sheet_profiles.py)
 SPACING_CM = 0.2  # 2mm de margem mínima
 
-def cm_to_px(cm: float) -> int:
-    return round(cm * PX_PER_CM)
+# lado maximo do derivado de previa gerado na ingestao (preview_url)
+ARTWORK_PREVIEW_MAX_SIDE = 512
 
-SHEET_WIDTH_PX = cm_to_px(SHEET_WIDTH_CM)
-SHEET_HEIGHT_PX = cm_to_px(SHEET_HEIGHT_CM)
-SPACING_PX = cm_to_px(SPACING_CM)
+# alpha <= este valor conta como transparente no trim (0 = so alpha zero)
+TRIM_ALPHA_THRESHOLD = int(os.getenv("TRIM_ALPHA_THRESHOLD", "0"))
+
+# Perfis de encoding PNG (implementacao em png_encoder.py)
+PNG_PROFILES = {
+    "fast": {"compress_level": 1, "filter": "none", "parallel": True, "quantize": False},
+    "balanced": {"compress_level": 6, "filter": "up", "parallel": True, "quantize": False},
+    "small": {"compress_level": 9, "filter": "adaptive", "parallel": False, "quantize": True},
+}
+
+DEFAULT_PNG_PROFILE = os.getenv("PNG_PROFILE", "balanced")
+PREVIEW_PNG_PROFILE = "fast"
+
+def resolve_profile(name: str | None) -> str:
+    name = name or DEFAULT_PNG_PROFILE
+    if name not in PNG_PROFILES:
+        raise ValueError(f"Perfil PNG inválido: {name}")
+    return name
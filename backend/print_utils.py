@@ -1,11 +1,18 @@
-from .print_config import PX_PER_CM
-from PIL import Image
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+from .print_config import DPI, TRIM_ALPHA_THRESHOLD
 import io
 import requests
 
+# Pillow so onde decodifica: cm_to_px e os downloads servem a API (packing)
+# sem carregar o Pillow
+if TYPE_CHECKING:
+    from PIL import Image
+
 
-def cm_to_px(cm: float) -> int:
-    return round(cm * PX_PER_CM)
+def cm_to_px(cm: float, dpi: int = DPI) -> int:
+    return round(cm * (dpi / 2.54))
 
 
 def can_place(x, y, w, h, occupied):
@@ -15,15 +22,64 @@ def can_place(x, y, w, h, occupied):
     return True
 
 
-def trim_transparent(img: Image.Image) -> Image.Image:
-    bbox = img.getbbox()
+def alpha_bbox(img: Image.Image, threshold: int = 0):
+    """
+    Bounding box dos pixels com alpha > threshold, calculado so no canal
+    alpha (sem imagem temporaria do tamanho da arte inteira).
+    """
+    if threshold <= 0:
+        return img.getbbox(alpha_only=True)
+
+    # LUT de 1 byte/pixel no canal alpha: descarta ruido quase transparente
+    alpha = img.getchannel("A").point(lambda v: 255 if v > threshold else 0)
+    return alpha.getbbox()
+
+
+def trim_transparent(img: Image.Image, threshold: int = TRIM_ALPHA_THRESHOLD) -> Image.Image:
+    bbox = alpha_bbox(img, threshold)
     if bbox:
         return img.crop(bbox)
     return img
 
 
-def load_print_image(url: str) -> Image.Image:
-    res = requests.get(url)
+# Sessao por processo: conexoes keep-alive reaproveitadas entre downloads
+# (e entre jobs no worker sem fork)
+_http = requests.Session()
+
+
+def fetch_print_bytes(url: str) -> bytes:
+    res = _http.get(url)
     res.raise_for_status()
-    img = Image.open(io.BytesIO(res.content)).convert("RGBA")
-    return trim_transparent(img)
+    return res.content
+
+
+def fetch_print_bytes_if_changed(url: str, validators: dict | None = None) -> tuple[bytes | None, dict | None]:
+    """
+    GET condicional com os validadores (ETag/Last-Modified) da ultima
+    resposta: (None, validadores) se a arte nao mudou (304), senao os bytes
+    novos e os validadores deles (None se o servidor nao manda nenhum).
+    """
+    headers = {}
+    if validators and validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators and validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+
+    res = _http.get(url, headers=headers)
+    if res.status_code == 304 and validators:
+        return None, validators
+    res.raise_for_status()
+
+    fresh = {"etag": res.headers.get("ETag"), "last_modified": res.headers.get("Last-Modified")}
+    return res.content, fresh if any(fresh.values()) else None
+
+
+def decode_print_image(data: bytes, trim: bool = True) -> Image.Image:
+    from PIL import Image
+
+    img = Image.open(io.BytesIO(data)).convert("RGBA")
+    return trim_transparent(img) if trim else img
+
+
+def load_print_image(url: str) -> Image.Image:
+    return decode_print_image(fetch_print_bytes(url))
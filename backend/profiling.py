@@ -0,0 +1,167 @@
+# backend/profiling.py
+#
+# Profiler opcional para renders lentos.
+#
+# Liga por job (payload["profile"] = true, via POST /jobs/{id}/profile com
+# X-Internal-Key) ou por amostragem (RENDER_PROFILE_SAMPLE_RATE=0.01 => ~1%
+# dos jobs). Desligado, o custo e um dict.get + random().
+#
+# O render roda em threads, entao em vez do cProfile (so enxerga a thread
+# que o ligou) usamos um amostrador de pilhas de todas as threads, mais
+# tracemalloc para alocacoes Python. Os artefatos vao gzipados para
+# jobs-output/profiles/{job_id}/.
+
+import os
+import sys
+import gzip
+import time
+import random
+import resource
+import threading
+import tracemalloc
+from collections import Counter
+
+from backend import storage_uploader
+
+PROFILE_SAMPLE_RATE = float(os.getenv("RENDER_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("RENDER_PROFILE_INTERVAL_MS", "5"))
+PROFILE_TRACEMALLOC_FRAMES = int(os.getenv("RENDER_PROFILE_TRACEMALLOC_FRAMES", "10"))
+
+PROFILE_BUCKET = "jobs-output"
+PROFILE_PREFIX = "profiles"
+TOP_N = 40
+
+# folhas de pilha que so indicam thread ociosa (esperando lock/fila/socket)
+IDLE_LEAVES = ("(threading.py:", "(selectors.py:", "(queue.py:", "_worker (thread.py:")
+
+
+def should_profile(payload: dict) -> bool:
+    if payload.get("profile"):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class _StackSampler(threading.Thread):
+    """Amostra a pilha de todas as threads a cada intervalo (tempo de parede)."""
+
+    def __init__(self, interval_s: float):
+        super().__init__(name="pvty-profiler", daemon=True)
+        self.interval_s = interval_s
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        me = threading.get_ident()
+        names = {}
+        while not self._stop_event.wait(self.interval_s):
+            self.samples += 1
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                if tid not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(tid, str(tid)))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class JobProfiler:
+    def __init__(self, job_id: str, preview: bool):
+        self.job_id = job_id
+        self.kind = "preview" if preview else "final"
+        self._sampler = _StackSampler(PROFILE_INTERVAL_MS / 1000)
+        self._own_tracemalloc = False
+        self._started = 0.0
+
+    def start(self) -> "JobProfiler":
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+            self._own_tracemalloc = True
+        self._started = time.perf_counter()
+        self._sampler.start()
+        print(f"🔬 Profiling job {self.job_id} ({self.kind})")
+        return self
+
+    def _stack_report(self, elapsed: float) -> str:
+        own = Counter()
+        for stack, n in self._sampler.stacks.items():
+            leaf = stack.rsplit(";", 1)[-1]
+            if not any(idle in leaf for idle in IDLE_LEAVES):
+                own[leaf] += n
+
+        lines = [
+            f"job {self.job_id} ({self.kind})",
+            f"wall {elapsed:.2f}s, {self._sampler.samples} amostras a cada {PROFILE_INTERVAL_MS} ms",
+            f"max_rss {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024} MB",
+            "",
+            "top funcoes (amostras no topo da pilha, todas as threads, sem ociosas):",
+        ]
+        lines += [f"{n:8d}  {label}" for label, n in own.most_common(TOP_N)]
+        return "\n".join(lines) + "\n"
+
+    def _alloc_report(self, snapshot) -> str:
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [
+            f"tracemalloc atual {current / 1e6:.1f} MB, pico {peak / 1e6:.1f} MB",
+            "(buffers de pixels do Pillow sao alocados em C e nao aparecem aqui; veja max_rss)",
+            "",
+        ]
+        for stat in snapshot.statistics("lineno")[:TOP_N]:
+            lines.append(f"{stat.size / 1e6:10.2f} MB  {stat.count:8d} blocos  {stat.traceback}")
+        return "\n".join(lines) + "\n"
+
+    def _upload(self, name: str, text: str) -> str:
+        path = f"{PROFILE_PREFIX}/{self.job_id}/{self.kind}-{name}.gz"
+        return storage_uploader.upload(PROFILE_BUCKET, path, gzip.compress(text.encode()), "application/gzip")
+
+    def finish(self) -> dict | None:
+        """Para a coleta e sobe os artefatos; nunca derruba o job."""
+        elapsed = time.perf_counter() - self._started
+        self._sampler.stop()
+
+        snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+        if snapshot is not None:
+            snapshot = snapshot.filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            ))
+
+        try:
+            artifacts = {
+                # formato "collapsed" (flamegraph.pl / speedscope)
+                "stacks": self._upload("stacks.txt", "".join(
+                    f"{stack} {n}\n" for stack, n in self._sampler.stacks.items()
+                )),
+                "report": self._upload("report.txt", self._stack_report(elapsed)),
+            }
+            if snapshot is not None:
+                artifacts["allocations"] = self._upload("alloc.txt", self._alloc_report(snapshot))
+        except Exception as e:
+            print(f"⚠️ Falha ao enviar profile do job {self.job_id}: {e}")
+            return None
+        finally:
+            if self._own_tracemalloc:
+                tracemalloc.stop()
+
+        print(f"🔬 Profile do job {self.job_id} salvo em {PROFILE_PREFIX}/{self.job_id}/")
+        return {"kind": self.kind, "seconds": round(elapsed, 2), **artifacts}
+
+
+def start_job_profiler(job_id: str, payload: dict, preview: bool) -> JobProfiler | None:
+    if not should_profile(payload):
+        return None
+    return JobProfiler(job_id, preview).start()
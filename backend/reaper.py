@@ -0,0 +1,140 @@
+# backend/reaper.py
+#
+# Jobs presos: worker morto (OOM, deploy, kill) nao chega no except de
+# process_render, entao o status fica "processing" para sempre. O reaper
+# procura jobs sem heartbeat recente e:
+#   - processing/processing_preview -> volta para a fila com backoff (ate
+#     JOB_MAX_ATTEMPTS) ou vira "error";
+#   - cancelling -> cancelled;
+#   - confirming (API caiu no meio do confirm) -> preview_done, para o
+#     usuario confirmar de novo (o consumo e idempotente por job_id).
+# Job gang que termina em cancelled/error leva junto os pedidos "ganged".
+#
+#   python -m backend.reaper [--once]
+#
+# Em producao roda como o processo "reaper" do Procfile (um so basta: as
+# transicoes sao condicionais, entao duas instancias nao duplicam nada).
+
+import os
+import time
+import argparse
+from datetime import datetime, timezone, timedelta
+
+from backend.supabase_client import supabase
+from backend.job_queue import queue
+from backend.jobs import enqueue_render, retry_backoff, close_gang_members, JOB_MAX_ATTEMPTS
+
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "180"))
+REAPER_INTERVAL_SECONDS = int(os.getenv("REAPER_INTERVAL_SECONDS", "60"))
+
+# status preso -> (status para voltar a fila, previa?)
+RUNNING_STATUSES = {
+    "processing": ("queued", False),
+    "processing_preview": ("preview", True),
+}
+
+
+def _utc(dt: datetime) -> str:
+    # sem "+00:00": o valor vai dentro de um filtro or=() do PostgREST
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def find_stale_jobs(now: datetime) -> list[dict]:
+    cutoff = _utc(now - timedelta(seconds=JOB_STALE_SECONDS))
+    return (
+        supabase.table("jobs")
+        .select("id,status,attempts,heartbeat_at,created_at")
+        .in_("status", [*RUNNING_STATUSES, "cancelling", "confirming"])
+        .or_(f'heartbeat_at.lt."{cutoff}",and(heartbeat_at.is.null,created_at.lt."{cutoff}")')
+        .execute()
+        .data
+    ) or []
+
+
+def _transition(job: dict, fields: dict) -> bool:
+    # condicional no status lido: outro reaper ou um worker vivo ganha a disputa
+    updated = (
+        supabase.table("jobs")
+        .update(fields)
+        .eq("id", job["id"])
+        .eq("status", job["status"])
+        .execute()
+    )
+    return bool(updated.data)
+
+
+def reap_job(job: dict, now: datetime) -> str | None:
+    status = job["status"]
+    now_iso = now.isoformat()
+
+    if status == "cancelling":
+        if _transition(job, {"status": "cancelled", "finished_at": now_iso}):
+            close_gang_members(job["id"], {"status": "cancelled", "finished_at": now_iso})
+            return "cancelled"
+        return None
+
+    if status == "confirming":
+        if _transition(job, {"status": "preview_done", "heartbeat_at": now_iso}):
+            return "unconfirmed"
+        return None
+
+    attempts = job.get("attempts") or 0
+    if attempts >= JOB_MAX_ATTEMPTS:
+        fields = {
+            "status": "error",
+            "error": f"Job interrompido {attempts}x (worker parou de responder)",
+            "finished_at": now_iso,
+        }
+        if _transition(job, fields):
+            # no-op se o job nao for gang
+            close_gang_members(job["id"], fields)
+            return "failed"
+        return None
+
+    retry_status, preview = RUNNING_STATUSES[status]
+    if not _transition(job, {"status": retry_status, "heartbeat_at": now_iso}):
+        return None
+
+    delay = retry_backoff(attempts)
+    enqueue_render(queue, job["id"], preview=preview, delay=delay)
+    print(f"🔁 Job {job['id']} sem heartbeat ({status}), tentativa {attempts + 1}/{JOB_MAX_ATTEMPTS} em {delay}s")
+    return "requeued"
+
+
+def reap_stale_jobs() -> dict[str, int]:
+    now = datetime.now(timezone.utc)
+    counts: dict[str, int] = {}
+
+    for job in find_stale_jobs(now):
+        try:
+            action = reap_job(job, now)
+        except Exception as e:
+            print(f"⚠️ Reaper falhou no job {job['id']}: {e}")
+            continue
+        if action:
+            counts[action] = counts.get(action, 0) + 1
+
+    if counts:
+        print(f"🧹 Reaper: {counts}")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--once", action="store_true")
+    args = parser.parse_args()
+
+    print(f"🧹 Reaper iniciado (stale > {JOB_STALE_SECONDS}s, a cada {REAPER_INTERVAL_SECONDS}s)")
+    while True:
+        try:
+            reap_stale_jobs()
+        except Exception as e:
+            print(f"⚠️ Reaper: {e}")
+
+        if args.once:
+            break
+        time.sleep(REAPER_INTERVAL_SECONDS)
+
+
+if __name__ == "__main__":
+    main()
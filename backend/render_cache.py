@@ -0,0 +1,82 @@
+# backend/render_cache.py
+import os
+import json
+import hashlib
+import requests
+
+from backend import storage_uploader
+from backend.print_config import TRIM_ALPHA_THRESHOLD
+
+# Bump whenever packing or rendering changes the output for the same input,
+# otherwise old cached sheets would keep being served.
+PACKER_VERSION = "hybrid-shelf-1"
+RENDERER_VERSION = "2"
+
+CACHE_BUCKET = "jobs-output"
+CACHE_PREFIX = "cache"
+CACHE_ENABLED = os.getenv("RENDER_CACHE_ENABLED", "true").lower() == "true"
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def sheet_cache_key(
+    sheet_w: int,
+    sheet_h: int,
+    dpi: int,
+    placements: list[dict],
+    art_hashes: dict[str, str],
+    preview: bool,
+    png_profile: str,
+) -> str:
+    """
+    Hash deterministico de uma folha: mesma versao do packer/render,
+    mesmo tamanho, mesmo DPI e mesma lista ordenada de posicionamentos
+    (por conteudo da arte, nao por URL) => mesmo PNG.
+    """
+    desc = {
+        "packer": PACKER_VERSION,
+        "renderer": RENDERER_VERSION,
+        "sheet": [sheet_w, sheet_h],
+        "dpi": dpi,
+        "preview": preview,
+        "png": png_profile,
+        "trim": TRIM_ALPHA_THRESHOLD,
+        "items": [
+            [
+                art_hashes[i["print_url"]],
+                i["w"],
+                i["h"],
+                i["x"],
+                i["y"],
+                bool(i.get("rotated")),
+            ]
+            for i in placements
+        ],
+    }
+    raw = json.dumps(desc, separators=(",", ":"), sort_keys=True).encode()
+    return hashlib.sha256(raw).hexdigest()
+
+
+def cache_path(key: str) -> str:
+    return f"{CACHE_PREFIX}/{key[:2]}/{key}.png"
+
+
+def lookup(key: str) -> str | None:
+    """Retorna a URL publica da folha ja renderizada, se existir."""
+    if not CACHE_ENABLED:
+        return None
+
+    url = storage_uploader.public_url(CACHE_BUCKET, cache_path(key))
+    try:
+        r = requests.head(url, timeout=5)
+    except requests.RequestException:
+        return None
+
+    return url if r.status_code == 200 else None
+
+
+def store(key: str, data) -> str:
+    # data: bytes, buffer do encoder ou caminho do PNG no disco
+    return storage_uploader.upload(CACHE_BUCKET, cache_path(key), data, "image/png")
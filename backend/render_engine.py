@@ -1,210 +1,440 @@
-import io
+import os
+import time
 import threading
+from collections import Counter, OrderedDict
+from functools import lru_cache, partial
 from concurrent.futures import ThreadPoolExecutor
-from PIL import Image, ImageChops, ImageDraw, ImageFilter
+from PIL import Image, ImageDraw, ImageFilter
 
-from backend.print_utils import load_print_image, cm_to_px
-from backend.print_config import SPACING_PX
+from backend.print_utils import fetch_print_bytes, fetch_print_bytes_if_changed, decode_print_image, cm_to_px
+from backend.print_config import PREVIEW_DPI, ARTWORK_PREVIEW_MAX_SIDE
+from backend.packing import pack_pieces, used_length, sheet_placements
 from backend.supabase_client import supabase
-
-_IMAGE_CACHE: dict[str, Image.Image] = {}
+from backend import render_cache, artwork_store
+from backend.storage_uploader import BulkUploader
+from backend.stage_timer import StageTimer
+from backend.metrics import IMAGE_CACHE, RENDER_SHEETS
+from backend.png_encoder import encode_png, encode_png_to, resolve_profile, PREVIEW_PNG_PROFILE
+from backend.sheet_profiles import job_sheet_profile
+
+# Artes decodificadas por hash do conteudo, LRU limitado por bytes: no
+# worker sem fork (WORKER_MODE=simple) o cache atravessa jobs; o limite
+# segura a memoria. Reupload no mesmo caminho muda o hash, nunca a entrada.
+IMAGE_CACHE_MAX_MB = int(os.getenv("IMAGE_CACHE_MAX_MB", "1024"))
+# URL -> (validadores HTTP, hash): revalidado a cada job com GET condicional
+URL_HASH_CACHE_MAX = int(os.getenv("URL_HASH_CACHE_MAX", "4096"))
+
+_IMAGE_CACHE: OrderedDict[str, Image.Image] = OrderedDict()
+_IMAGE_CACHE_BYTES = 0
+_URL_HASHES: OrderedDict[str, tuple[dict, str]] = OrderedDict()
+_RAW_CACHE: dict[str, bytes] = {}
 _CACHE_LOCK = threading.Lock()
 
 
-class Shelf:
-    def __init__(self, y):
-        self.y = y
-        self.height = 0
-        self.used_width = 0
+class RenderCancelled(Exception):
+    """Cancelamento pedido pelo usuario, detectado entre folhas."""
 
 
-class Sheet:
-    def __init__(self):
-        self.shelves = []
-        self.used_height = 0
-        self.items = []
+def resize_to_slot(img: Image.Image, w: int, h: int) -> Image.Image:
+    return img.resize((w, h), Image.LANCZOS)
 
 
-def trim_transparency(img: Image.Image) -> Image.Image:
-    bg = Image.new(img.mode, img.size, (0, 0, 0, 0))
-    diff = ImageChops.difference(img, bg)
-    bbox = diff.getbbox()
-    return img.crop(bbox) if bbox else img
+def fit_artwork(img: Image.Image, w: int, h: int, rotated: bool = False) -> Image.Image:
+    """
+    Arte redimensionada (e girada) para a vaga. A origem e compartilhada e
+    somente-leitura; transpose gira sem reamostrar (mesmos bytes que
+    rotate(90, expand=True)).
+    """
+    art = resize_to_slot(img, w, h)
+    if rotated:
+        art = art.transpose(Image.Transpose.ROTATE_90)
+    return art
 
 
-def resize_to_slot(img: Image.Image, w: int, h: int) -> Image.Image:
-    return img.resize((w, h), Image.LANCZOS)
+WATERMARK_TEXT = "PRÉVIA • PVTY"
+WATERMARK_STEP = 260
+WATERMARK_BLUR = 1.0
+
+
+@lru_cache(maxsize=4)
+def _watermark_tile(text: str) -> Image.Image:
+    tile = Image.new("RGBA", (WATERMARK_STEP, WATERMARK_STEP), (0, 0, 0, 0))
+    ImageDraw.Draw(tile).text((0, 0), text, fill=(0, 0, 0, 30))
+    return tile.filter(ImageFilter.GaussianBlur(radius=WATERMARK_BLUR))
+
 
+@lru_cache(maxsize=4)
+def _watermark_strip(text: str, width: int) -> Image.Image:
+    # Uma faixa (largura da folha x 1 passo) montada uma vez por tamanho de folha
+    tile = _watermark_tile(text)
+    strip = Image.new("RGBA", (width, WATERMARK_STEP), (0, 0, 0, 0))
+    for x in range(0, width, WATERMARK_STEP):
+        strip.paste(tile, (x, 0))
+    return strip
 
-def apply_watermark(img: Image.Image, text: str = "PRÉVIA • PVTY") -> Image.Image:
-    overlay = Image.new("RGBA", img.size, (0, 0, 0, 0))
-    draw = ImageDraw.Draw(overlay)
 
+@lru_cache(maxsize=4)
+def _watermark_label(text: str) -> Image.Image:
+    pad = 4
+    text_w, text_h = ImageDraw.Draw(Image.new("RGBA", (1, 1))).textbbox((0, 0), text)[2:]
+    label = Image.new("RGBA", (text_w + 2 * pad, text_h + 2 * pad), (0, 0, 0, 0))
+    ImageDraw.Draw(label).text((pad, pad), text, fill=(0, 0, 0, 80))
+    return label.filter(ImageFilter.GaussianBlur(radius=WATERMARK_BLUR))
+
+
+def warm_watermark(sheet_width: int, text: str = WATERMARK_TEXT):
+    _watermark_strip(text, sheet_width)
+    _watermark_label(text)
+
+
+def apply_watermark(img: Image.Image, text: str = WATERMARK_TEXT, regions=None) -> Image.Image:
+    """
+    Desfoca so onde ha arte (regions = caixas dos itens, ou o bbox do alpha)
+    e compoe a marca d'agua ja desfocada, reaproveitada entre folhas.
+    Pixels totalmente transparentes nao passam pelo blur.
+    """
     w, h = img.size
-    step = 260
+    margin = 3 * int(WATERMARK_BLUR + 1)
 
-    for y in range(0, h, step):
-        for x in range(0, w, step):
-            draw.text((x, y), text, fill=(0, 0, 0, 30))
+    if regions is None:
+        bbox = img.getbbox(alpha_only=True)
+        regions = [bbox] if bbox else []
 
-    text_w, text_h = draw.textbbox((0, 0), text)[2:]
-    draw.text(((w - text_w) / 2, (h - text_h) / 2), text, fill=(0, 0, 0, 80))
+    for left, top, right, bottom in regions:
+        box = (max(left - margin, 0), max(top - margin, 0), min(right + margin, w), min(bottom + margin, h))
+        img.paste(img.crop(box).filter(ImageFilter.GaussianBlur(radius=WATERMARK_BLUR)), box)
 
-    img = Image.alpha_composite(img, overlay)
-    img = img.filter(ImageFilter.GaussianBlur(radius=1.0))
+    strip = _watermark_strip(text, w)
+    for y in range(0, h, WATERMARK_STEP):
+        img.alpha_composite(strip, dest=(0, y), source=(0, 0, w, min(WATERMARK_STEP, h - y)))
+
+    label = _watermark_label(text)
+    img.alpha_composite(label, dest=((w - label.width) // 2, (h - label.height) // 2))
     return img
 
 
-def pack_items_hybrid(raw_items, sheet_width, sheet_height):
-    items = [{**i} for i in raw_items]
-    SHEET_AREA = sheet_width * sheet_height
-
-    large, medium, small = [], [], []
-
-    for i in items:
-        area = i["w"] * i["h"]
-        if area >= 0.25 * SHEET_AREA:
-            large.append(i)
-        elif area >= 0.05 * SHEET_AREA:
-            medium.append(i)
-        else:
-            small.append(i)
-
-    for group in (large, medium, small):
-        group.sort(key=lambda i: max(i["w"], i["h"]), reverse=True)
-
-    sheets: list[Sheet] = []
-
-    def place(item):
-        for sheet in sheets:
-            for shelf in sheet.shelves:
-                for w, h, r in [(item["w"], item["h"], False), (item["h"], item["w"], True)]:
-                    if shelf.used_width + w + SPACING_PX <= sheet_width and shelf.y + h + SPACING_PX <= sheet_height:
-                        item.update({"x": shelf.used_width, "y": shelf.y, "rotated": r})
-                        shelf.used_width += w + SPACING_PX
-                        shelf.height = max(shelf.height, h + SPACING_PX)
-                        sheet.items.append(item)
-                        return True
-        return False
-
-    for group in (large, medium, small):
-        for item in group:
-            if place(item):
-                continue
-
-            placed = False
-            for sheet in sheets:
-                for w, h, r in [(item["w"], item["h"], False), (item["h"], item["w"], True)]:
-                    if sheet.used_height + h + SPACING_PX <= sheet_height:
-                        shelf = Shelf(sheet.used_height)
-                        shelf.used_width = w + SPACING_PX
-                        shelf.height = h + SPACING_PX
-                        item.update({"x": 0, "y": shelf.y, "rotated": r})
-                        sheet.shelves.append(shelf)
-                        sheet.used_height += shelf.height
-                        sheet.items.append(item)
-                        placed = True
-                        break
-                if placed:
-                    break
-
-            if placed:
-                continue
-
-            sheet = Sheet()
-            for w, h, r in [(item["w"], item["h"], False), (item["h"], item["w"], True)]:
-                if h + SPACING_PX <= sheet_height:
-                    shelf = Shelf(0)
-                    shelf.used_width = w + SPACING_PX
-                    shelf.height = h + SPACING_PX
-                    item.update({"x": 0, "y": 0, "rotated": r})
-                    sheet.shelves.append(shelf)
-                    sheet.used_height = shelf.height
-                    sheet.items.append(item)
-                    sheets.append(sheet)
-                    placed = True
-                    break
-
-            if not placed:
-                raise ValueError(f"Item não coube: {item}")
-
-    return sheets
-
-
-def _load_cached_image(url: str) -> Image.Image:
+def warm_caches(profiles) -> None:
+    """
+    Marca d'agua da previa (faixa por largura de folha) montada de antemao;
+    o worker chama antes do fork, e cada job herda pronta.
+    """
+    _watermark_label(WATERMARK_TEXT)
+    widths = []
+    for profile in profiles:
+        dpi = profile["dpi"]
+        width = max(1, round(cm_to_px(profile["width_cm"], dpi) * min(PREVIEW_DPI, dpi) / dpi))
+        if width not in widths:
+            widths.append(width)
+    for width in widths[:_watermark_strip.cache_info().maxsize]:
+        _watermark_strip(WATERMARK_TEXT, width)
+
+
+def preview_source(piece: dict, dpi: int) -> dict:
+    """
+    Previa: troca a arte pelo derivado pequeno da ingestao (preview_url)
+    quando ele cobre a vaga no DPI da previa. O empacotamento nao depende
+    da URL, entao o layout e o mesmo da final.
+    """
+    if not piece.get("preview_url"):
+        return piece
+    if cm_to_px(max(piece["width"], piece["height"]), min(PREVIEW_DPI, dpi)) > ARTWORK_PREVIEW_MAX_SIDE:
+        return piece
+    # content_hash e do canonico: o do derivado sai do download
+    return {**piece, "url": piece["preview_url"], "content_hash": None}
+
+
+def _artwork_hash(url: str, timer: StageTimer | None = None) -> str:
+    """
+    Hash do conteudo atual da URL. O que ja foi visto e revalidado com GET
+    condicional (ETag/Last-Modified): 304 reaproveita o hash sem baixar,
+    e um reupload no mesmo caminho chega como arte nova.
+    """
     with _CACHE_LOCK:
-        if url in _IMAGE_CACHE:
-            return _IMAGE_CACHE[url].copy()
+        validators, digest = _URL_HASHES.get(url, (None, None))
+
+    t0 = time.perf_counter()
+    data, validators = fetch_print_bytes_if_changed(url, validators)
+    if data is None:
+        return digest
+    if timer:
+        timer.add("download", (time.perf_counter() - t0) * 1000, items=1, bytes=len(data))
+    digest = render_cache.content_hash(data)
 
-    img = load_print_image(url)
+    with _CACHE_LOCK:
+        _URL_HASHES.pop(url, None)
+        if validators:
+            _URL_HASHES[url] = (validators, digest)
+            while len(_URL_HASHES) > URL_HASH_CACHE_MAX:
+                _URL_HASHES.popitem(last=False)
+        if digest not in _IMAGE_CACHE:
+            # guardado ate o decode, evita baixar de novo em caso de cache miss
+            _RAW_CACHE[digest] = data
+
+    return digest
+
+
+def _image_bytes(img: Image.Image) -> int:
+    return img.width * img.height * len(img.getbands())
+
+
+def _cache_image(digest: str, img: Image.Image):
+    """Chamar com _CACHE_LOCK. Descarta as menos usadas acima do limite."""
+    global _IMAGE_CACHE_BYTES
+    previous = _IMAGE_CACHE.pop(digest, None)
+    if previous is not None:
+        _IMAGE_CACHE_BYTES -= _image_bytes(previous)
+    _IMAGE_CACHE[digest] = img
+    _IMAGE_CACHE_BYTES += _image_bytes(img)
+
+    # quem ja pegou a imagem segue com a referencia; so sai do cache
+    while _IMAGE_CACHE_BYTES > IMAGE_CACHE_MAX_MB * 1024 * 1024 and len(_IMAGE_CACHE) > 1:
+        _, evicted = _IMAGE_CACHE.popitem(last=False)
+        _IMAGE_CACHE_BYTES -= _image_bytes(evicted)
+        IMAGE_CACHE.labels(result="evicted").inc()
+
+
+def _load_cached_image(
+    url: str,
+    digest: str,
+    trimmed: bool = False,
+    timer: StageTimer | None = None,
+) -> Image.Image:
+    """
+    Arte decodificada e trimada, compartilhada e somente-leitura: quem
+    transforma (resize/rotate) sempre gera imagem nova, entao nao copiamos.
+    A chave e o hash do conteudo; `trimmed` so poupa o trim (que e
+    idempotente), entao a mesma entrada serve com ou sem ele.
+    """
+    with _CACHE_LOCK:
+        if digest in _IMAGE_CACHE:
+            IMAGE_CACHE.labels(result="hit").inc()
+            _IMAGE_CACHE.move_to_end(digest)
+            return _IMAGE_CACHE[digest]
+        data = _RAW_CACHE.pop(digest, None)
+
+    t0 = time.perf_counter()
+    img = artwork_store.open_artwork(digest)
+    if img is not None:
+        IMAGE_CACHE.labels(result="store").inc()
+        if timer:
+            timer.add("store_open", (time.perf_counter() - t0) * 1000, items=1)
+    else:
+        IMAGE_CACHE.labels(result="miss").inc()
+        if data is None:
+            data = fetch_print_bytes(url)
+        img = decode_print_image(data, trim=not trimmed)
+        if timer:
+            timer.add("decode", (time.perf_counter() - t0) * 1000, items=1, bytes=len(data))
+
+        t0 = time.perf_counter()
+        artwork_store.save_artwork(digest, img)
+        # reabre mapeado: o heap do processo solta a copia decodificada
+        img = artwork_store.open_artwork(digest) or img
+        if timer:
+            timer.add("store_write", (time.perf_counter() - t0) * 1000, items=1)
 
     with _CACHE_LOCK:
-        _IMAGE_CACHE[url] = img
+        _cache_image(digest, img)
+
+    return img
 
-    return img.copy()
 
+def process_print_job(
+    job_id: str,
+    pieces: list[dict],
+    preview: bool = False,
+    timer: StageTimer | None = None,
+    checkpoints: dict[int, dict] | None = None,
+    on_sheets=None,
+    should_cancel=None,
+    spool_dir: str | None = None,
+):
+    """
+    checkpoints: folhas ja entregues numa execucao anterior do mesmo job
+    ({page_index: {"public_url", "sheet_key"}}); so sao reaproveitadas se a
+    chave da folha ainda bater.
+    on_sheets(results): chamado assim que cada folha e entregue (checkpoint).
+    should_cancel(): consultado antes de cada folha; True => RenderCancelled.
+    pieces com "job_id" (job gang) voltam com "placements" por folha,
+    indicando de qual pedido e cada peca.
+    spool_dir: o PNG e encodado direto num arquivo desse diretorio (a folha
+    volta com "path"), lido em stream pelo upload e pelo ZIP; sem ele, o
+    buffer do encoder sobe sem copia (memoryview).
+    """
+    timer = timer or StageTimer(job_id, preview=preview)
+    checkpoints = checkpoints or {}
 
-def process_print_job(job_id: str, pieces: list[dict], preview: bool = False):
     job = supabase.table("jobs").select("payload").eq("id", job_id).single().execute().data or {}
     payload = job.get("payload") or {}
 
-    sheet_size = payload.get("sheet_size", "30x100")
-    if sheet_size == "57x100":
-        width_cm, height_cm = 57, 100
-    else:
-        width_cm, height_cm = 30, 100
-
-    items = [
-        {
-            "print_url": p["url"],
-            "w": cm_to_px(p["width"] ),
-            "h": cm_to_px(p["height"] ),
-        }
-        for p in pieces
-    ]
+    png_profile = PREVIEW_PNG_PROFILE if preview else resolve_profile(payload.get("png_profile"))
 
-    sheet_w = cm_to_px(width_cm )
-    sheet_h = cm_to_px(height_cm )
+    profile = job_sheet_profile(payload)
+    dpi = profile["dpi"]
+    if preview:
+        pieces = [preview_source(p, dpi) for p in pieces]
 
-    sheets = pack_items_hybrid(items, sheet_w, sheet_h)
+    # Artes normalizadas no upload ja chegam trimadas e com hash conhecido
+    # (o do payload vale mais que o revalidado): nem precisam ser baixadas
+    # para montar a chave do cache.
+    known_hashes = {p["url"]: p["content_hash"] for p in pieces if p.get("content_hash")}
+    trimmed_urls = {p["url"] for p in pieces if p.get("trimmed")}
 
-    unique_urls = list({i["print_url"] for i in items})
-    with ThreadPoolExecutor(max_workers=8) as ex:
-        list(ex.map(_load_cached_image, unique_urls))
+    with timer.span("pack", items=len(pieces)) as c:
+        sheets, sheet_w, sheet_h = pack_pieces(pieces, profile)
+        c["sheets"] = len(sheets)
 
-    def render_only(args):
-        idx, sheet = args
-        img = Image.new("RGBA", (sheet_w, sheet_h), (255, 255, 255, 0))
+    # Rolo: o packer enche cada segmento de cima para baixo, entao so o
+    # ultimo sobra; cortar no comprimento usado economiza filme e pixels
+    if profile["roll"]:
+        tail = cm_to_px(profile["bleed_cm"] or profile["spacing_cm"], dpi)
+        heights = [used_length(sheet, sheet_h, tail) for sheet in sheets]
+    else:
+        heights = [sheet_h] * len(sheets)
 
-        for item in sheet.items:
-            art = _load_cached_image(item["print_url"])
-            art = trim_transparency(art)
-            art = resize_to_slot(art, item["w"], item["h"])
-            if item.get("rotated"):
-                art = art.rotate(90, expand=True)
-            img.alpha_composite(art, dest=(item["x"], item["y"]))
+    unique_urls = list({p["url"] for p in pieces if p["url"] not in known_hashes})
+    with timer.span("fetch", items=len(unique_urls)):
+        with ThreadPoolExecutor(max_workers=8) as ex:
+            art_hashes = dict(zip(unique_urls, ex.map(partial(_artwork_hash, timer=timer), unique_urls)))
+    art_hashes.update(known_hashes)
 
-        if preview:
-            img = apply_watermark(img)
+    def load_artwork(url: str, timer: StageTimer | None = None) -> Image.Image:
+        return _load_cached_image(url, art_hashes[url], url in trimmed_urls, timer=timer)
 
-        buf = io.BytesIO()
-        img.save(buf, format="PNG")
-        buf.seek(0)
-        return idx, buf.read()
+    # Previa sai em resolucao de tela (PREVIEW_DPI): o empacotamento e o
+    # mesmo da final, so as coordenadas sao escaladas na hora de compor.
+    out_dpi = min(PREVIEW_DPI, dpi) if preview else dpi
+    scale = out_dpi / dpi
 
-    with ThreadPoolExecutor(max_workers=4) as ex:
-        rendered = list(ex.map(render_only, enumerate(sheets)))
+    def scaled(v: int) -> int:
+        return max(1, round(v * scale))
 
-    results = []
-    for idx, data in rendered:
-        filename = f"jobs/{job_id}/{ 'preview' if preview else 'final' }/{idx}.png"
+    keys = [
+        render_cache.sheet_cache_key(sheet_w, heights[idx], out_dpi, sheet.items, art_hashes, preview, png_profile)
+        for idx, sheet in enumerate(sheets)
+    ]
+    results = [
+        {"url": None, "page_index": idx, "sheet_key": key, "length_cm": round(heights[idx] * 2.54 / dpi, 1)}
+        for idx, key in enumerate(keys)
+    ]
+    if any(p.get("job_id") for p in pieces):
+        for idx, sheet in enumerate(sheets):
+            results[idx]["placements"] = sheet_placements(sheet)
 
-        supabase.storage.from_("jobs-output").upload(
-            filename,
-            data,
-            {"content-type": "image/png", "upsert": "true"},
-        )
+    resumed = [
+        idx for idx, key in enumerate(keys)
+        if (checkpoints.get(idx) or {}).get("sheet_key") == key
+    ]
+    for idx in resumed:
+        results[idx]["url"] = checkpoints[idx]["public_url"]
+        results[idx]["resumed"] = True
+    if resumed:
+        print(f"⏯️ Job {job_id}: retomando, {len(resumed)}/{len(sheets)} folhas ja entregues")
+
+    pending = [idx for idx in range(len(sheets)) if results[idx]["url"] is None]
+    with timer.span("cache_lookup", items=len(pending)) as c:
+        with ThreadPoolExecutor(max_workers=8) as ex:
+            for idx, url in zip(pending, ex.map(render_cache.lookup, [keys[i] for i in pending])):
+                results[idx]["url"] = url
+        c["hits"] = sum(1 for idx in pending if results[idx]["url"])
+
+    hits = [results[idx] for idx in pending if results[idx]["url"]]
+    if hits and on_sheets:
+        on_sheets(hits)
+
+    missing = [idx for idx in pending if results[idx]["url"] is None]
+    RENDER_SHEETS.labels(source="cache").inc(len(hits))
+    RENDER_SHEETS.labels(source="rendered").inc(len(missing))
+    print(f"♻️ Job {job_id}: {len(hits)}/{len(pending)} folhas reaproveitadas do cache")
+
+    needed_urls = list({i["print_url"] for idx in missing for i in sheets[idx].items})
+    with timer.span("load", items=len(needed_urls)):
+        with ThreadPoolExecutor(max_workers=8) as ex:
+            list(ex.map(partial(load_artwork, timer=timer), needed_urls))
+
+    # Mesma arte no mesmo tamanho/rotacao aparece varias vezes (kits):
+    # redimensiona uma vez por job e reaproveita entre folhas e threads,
+    # soltando a imagem apos o ultimo uso.
+    def fit_key(item) -> tuple:
+        return (item["print_url"], scaled(item["w"]), scaled(item["h"]), bool(item.get("rotated")))
+
+    fitted: dict[tuple, Image.Image] = {}
+    uses_left = Counter(fit_key(i) for idx in missing for i in sheets[idx].items)
+    fitted_lock = threading.Lock()
+
+    def fitted_artwork(item) -> tuple[Image.Image, int]:
+        key = fit_key(item)
+        with fitted_lock:
+            art = fitted.get(key)
+            reused = art is not None
+
+        if art is None:
+            # ja vem trimada: no upload (normalizada) ou no decode
+            art = fit_artwork(load_artwork(item["print_url"]), *key[1:])
+
+        with fitted_lock:
+            art = fitted.setdefault(key, art)
+            uses_left[key] -= 1
+            if uses_left[key] <= 0:
+                fitted.pop(key, None)
+        return art, int(reused)
+
+    def render_only(idx):
+        if should_cancel and should_cancel():
+            raise RenderCancelled(job_id)
+
+        sheet = sheets[idx]
+        img = Image.new("RGBA", (scaled(sheet_w), scaled(heights[idx])), (255, 255, 255, 0))
+        regions = []
 
-        results.append(supabase.storage.from_("jobs-output").get_public_url(filename))
+        for item in sheet.items:
+            with timer.span("resize", items=1) as c:
+                art, c["reused"] = fitted_artwork(item)
+            x, y = round(item["x"] * scale), round(item["y"] * scale)
+            with timer.span("composite", items=1):
+                img.alpha_composite(art, dest=(x, y))
+            regions.append((x, y, x + art.width, y + art.height))
+
+        if preview:
+            with timer.span("watermark", items=1):
+                img = apply_watermark(img, regions=regions)
+
+        with timer.span("encode", items=1) as c:
+            if spool_dir:
+                data = os.path.join(spool_dir, f"PVTY_PAGE_{idx + 1}.png")
+                with open(data, "wb") as f:
+                    stats = encode_png_to(img, f, png_profile, dpi=out_dpi)
+            else:
+                data, stats = encode_png(img, png_profile, dpi=out_dpi)
+            c["bytes"] = stats["bytes"]
+        del img
+
+        # o upload sai da thread de render: a proxima folha ja comeca
+        uploader.submit(deliver, idx, data, stats)
+
+    def deliver(idx, data, stats):
+        # sobe e registra na hora: se o worker cair, a proxima execucao
+        # retoma a partir daqui
+        with timer.span("upload", items=1, bytes=stats["bytes"]):
+            results[idx]["url"] = render_cache.store(keys[idx], data)
+        results[idx]["encode"] = stats
+        if spool_dir:
+            results[idx]["path"] = data
+        if on_sheets:
+            on_sheets([results[idx]])
+
+    try:
+        with timer.span("render", items=len(missing)):
+            # se o render falhar, o close do uploader ainda espera as folhas
+            # ja encodadas subirem (viram checkpoint para a retomada)
+            with BulkUploader() as uploader:
+                with ThreadPoolExecutor(max_workers=4) as ex:
+                    list(ex.map(render_only, missing))
+                uploader.wait()
+    finally:
+        fitted.clear()
+        with _CACHE_LOCK:
+            for digest in art_hashes.values():
+                _RAW_CACHE.pop(digest, None)
 
     return results
@@ -9,79 +9,52 @@ class UsageStatus:
     BLOCKED = "blocked"
 
 
-def get_usage(supabase, user_id: str):
-    now = datetime.now(timezone.utc)
-
-    # =========================
-    # BUSCA ASSINATURA ATIVA
-    # =========================
-    sub_res = (
+def _subscription_query(supabase, user_id: str):
+    return (
         supabase
         .table("subscriptions")
         .select("price_id,status,current_period_start,current_period_end,monthly_limit")
         .eq("user_id", user_id)
         .eq("status", "active")
         .limit(1)
-        .execute()
-        .data
-        or []
     )
 
-    # =========================
-    # FREE USER (RENOVA DIARIAMENTE)
-    # =========================
-    if not sub_res:
-        period_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        period_end = period_start + timedelta(days=1)
 
-        plan = (
-            supabase
-            .table("plans")
-            .select("daily_limit")
-            .eq("price_id", "free")
-            .limit(1)
-            .execute()
-            .data
-            or [{}]
-        )[0]
+def _free_plan_query(supabase):
+    return (
+        supabase
+        .table("plans")
+        .select("daily_limit")
+        .eq("price_id", "free")
+        .limit(1)
+    )
 
-        limit = plan.get("daily_limit", 0) or 0
 
-        used_rows = (
-            supabase
-            .table("usage")
-            .select("amount")
-            .eq("user_id", user_id)
-            .gte("created_at", period_start.isoformat())
-            .lt("created_at", period_end.isoformat())
-            .execute()
-            .data
-            or []
-        )
+def _used_query(supabase, user_id: str, period_start: datetime, period_end: datetime):
+    return (
+        supabase
+        .table("usage")
+        .select("amount")
+        .eq("user_id", user_id)
+        .gte("created_at", period_start.isoformat())
+        .lt("created_at", period_end.isoformat())
+    )
 
-        used = sum(r.get("amount", 0) for r in used_rows)
 
-        status = UsageStatus.OK
-        if limit and used >= limit:
-            status = UsageStatus.BLOCKED
-        elif limit and used >= limit * 0.8:
-            status = UsageStatus.WARNING
+def _status(used: int, limit: int) -> str:
+    if limit and used >= limit:
+        return UsageStatus.BLOCKED
+    if limit and used >= limit * 0.8:
+        return UsageStatus.WARNING
+    return UsageStatus.OK
 
-        return {
-            "plan": "free",
-            "used": used,
-            "limit": limit,
-            "remaining_days": 0,
-            "status": status,
-            "period_start": period_start,
-            "period_end": period_end,
-        }
 
-    # =========================
-    # PAID USER (MENSAL)
-    # =========================
-    sub = sub_res[0]
+def _free_period(now: datetime):
+    period_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    return period_start, period_start + timedelta(days=1)
+
 
+def _paid_period(sub: dict):
     period_start = datetime.fromtimestamp(
         sub["current_period_start"],
         tz=timezone.utc,
@@ -90,32 +63,38 @@ def get_usage(supabase, user_id: str):
         sub["current_period_end"],
         tz=timezone.utc,
     )
+    return period_start, period_end
 
-    if now >= period_end:
-        return {
-            "plan": sub.get("price_id"),
-            "used": 0,
-            "limit": 0,
-            "remaining_days": 0,
-            "status": UsageStatus.BLOCKED,
-            "period_start": period_start,
-            "period_end": period_end,
-        }
 
-    limit = sub.get("monthly_limit", 0) or 0
+def _free_usage(period_start, period_end, plan: dict, used_rows: list):
+    limit = plan.get("daily_limit", 0) or 0
+    used = sum(r.get("amount", 0) for r in used_rows)
+
+    return {
+        "plan": "free",
+        "used": used,
+        "limit": limit,
+        "remaining_days": 0,
+        "status": _status(used, limit),
+        "period_start": period_start,
+        "period_end": period_end,
+    }
+
+
+def _expired_usage(sub: dict, period_start, period_end):
+    return {
+        "plan": sub.get("price_id"),
+        "used": 0,
+        "limit": 0,
+        "remaining_days": 0,
+        "status": UsageStatus.BLOCKED,
+        "period_start": period_start,
+        "period_end": period_end,
+    }
 
-    used_rows = (
-        supabase
-        .table("usage")
-        .select("amount")
-        .eq("user_id", user_id)
-        .gte("created_at", period_start.isoformat())
-        .lt("created_at", period_end.isoformat())
-        .execute()
-        .data
-        or []
-    )
 
+def _paid_usage(now, sub: dict, period_start, period_end, used_rows: list):
+    limit = sub.get("monthly_limit", 0) or 0
     used = sum(r.get("amount", 0) for r in used_rows)
 
     remaining_days = max(
@@ -123,23 +102,69 @@ def get_usage(supabase, user_id: str):
         ceil((period_end - now).total_seconds() / 86400)
     )
 
-    status = UsageStatus.OK
-    if limit and used >= limit:
-        status = UsageStatus.BLOCKED
-    elif limit and used >= limit * 0.8:
-        status = UsageStatus.WARNING
-
     return {
         "plan": sub.get("price_id"),
         "used": used,
         "limit": limit,
         "remaining_days": remaining_days,
-        "status": status,
+        "status": _status(used, limit),
         "period_start": period_start,
         "period_end": period_end,
     }
 
 
+def get_usage(supabase, user_id: str):
+    now = datetime.now(timezone.utc)
+
+    # =========================
+    # BUSCA ASSINATURA ATIVA
+    # =========================
+    sub_res = _subscription_query(supabase, user_id).execute().data or []
+
+    # =========================
+    # FREE USER (RENOVA DIARIAMENTE)
+    # =========================
+    if not sub_res:
+        period_start, period_end = _free_period(now)
+        plan = (_free_plan_query(supabase).execute().data or [{}])[0]
+        used_rows = _used_query(supabase, user_id, period_start, period_end).execute().data or []
+        return _free_usage(period_start, period_end, plan, used_rows)
+
+    # =========================
+    # PAID USER (MENSAL)
+    # =========================
+    sub = sub_res[0]
+    period_start, period_end = _paid_period(sub)
+
+    if now >= period_end:
+        return _expired_usage(sub, period_start, period_end)
+
+    used_rows = _used_query(supabase, user_id, period_start, period_end).execute().data or []
+    return _paid_usage(now, sub, period_start, period_end, used_rows)
+
+
+async def aget_usage(supabase, user_id: str):
+    """Mesmo calculo de get_usage, usando o cliente async do Supabase."""
+    now = datetime.now(timezone.utc)
+
+    sub_res = (await _subscription_query(supabase, user_id).execute()).data or []
+
+    if not sub_res:
+        period_start, period_end = _free_period(now)
+        plan = ((await _free_plan_query(supabase).execute()).data or [{}])[0]
+        used_rows = (await _used_query(supabase, user_id, period_start, period_end).execute()).data or []
+        return _free_usage(period_start, period_end, plan, used_rows)
+
+    sub = sub_res[0]
+    period_start, period_end = _paid_period(sub)
+
+    if now >= period_end:
+        return _expired_usage(sub, period_start, period_end)
+
+    used_rows = (await _used_query(supabase, user_id, period_start, period_end).execute()).data or []
+    return _paid_usage(now, sub, period_start, period_end, used_rows)
+
+
 def consume_usage(
     supabase,
     user_id: str,
@@ -0,0 +1,131 @@
+# backend/sheet_profiles.py
+#
+# Perfis de folha/filme referenciados por PrintJobRequest.sheet_size:
+#   width_cm    largura do filme
+#   length_cm   altura da folha (ou comprimento maximo de um segmento de rolo)
+#   roll        rolo: cada segmento e cortado no comprimento usado
+#   dpi         resolucao do render final (todas as conversoes cm -> px)
+#   spacing_cm  vao minimo entre pecas
+#   bleed_cm    borda sem impressao nas bordas do filme
+#
+# Fontes (a ultima vence): perfis embutidos, SHEET_PROFILES_FILE (JSON
+# {nome: {...}}) e a tabela sheet_profiles (linhas ativas), relidas a cada
+# SHEET_PROFILES_TTL_SECONDS. O job guarda o perfil resolvido no payload,
+# entao mudar o registro nao altera jobs ja criados.
+
+import os
+import json
+import time
+import threading
+
+from backend.print_config import DPI, SPACING_CM
+from backend.supabase_client import supabase
+
+SHEET_PROFILES_FILE = os.getenv("SHEET_PROFILES_FILE", "")
+SHEET_PROFILES_TTL_SECONDS = float(os.getenv("SHEET_PROFILES_TTL_SECONDS", "300"))
+ROLL_MAX_LENGTH_CM = float(os.getenv("ROLL_MAX_LENGTH_CM", "100"))
+
+DEFAULT_SHEET_PROFILE = "30x100"
+
+BUILTIN_SHEET_PROFILES = {
+    "30x100": {"label": "30x100", "width_cm": 30, "length_cm": 100},
+    "57x100": {"label": "57x100", "width_cm": 57, "length_cm": 100},
+    # comprimento maximo do segmento limita a memoria de uma folha
+    "30xroll": {"label": "Rolo 30 cm", "width_cm": 30, "length_cm": ROLL_MAX_LENGTH_CM, "roll": True},
+    "57xroll": {"label": "Rolo 57 cm", "width_cm": 57, "length_cm": ROLL_MAX_LENGTH_CM, "roll": True},
+}
+
+_state = {"profiles": None, "loaded_at": 0.0}
+_lock = threading.Lock()
+
+
+def _value(raw: dict, key: str, default):
+    # colunas opcionais da tabela chegam como null
+    value = raw.get(key)
+    return default if value is None else value
+
+
+def _normalize(name: str, raw: dict) -> dict:
+    profile = {
+        "name": name,
+        "label": str(raw.get("label") or name),
+        "width_cm": float(raw["width_cm"]),
+        "length_cm": float(raw["length_cm"]),
+        "roll": bool(_value(raw, "roll", False)),
+        "dpi": int(_value(raw, "dpi", DPI)),
+        "spacing_cm": float(_value(raw, "spacing_cm", SPACING_CM)),
+        "bleed_cm": float(_value(raw, "bleed_cm", 0)),
+    }
+    if profile["width_cm"] <= 0 or profile["length_cm"] <= 0 or profile["dpi"] <= 0:
+        raise ValueError("largura, comprimento e dpi devem ser positivos")
+    if profile["spacing_cm"] < 0 or profile["bleed_cm"] < 0:
+        raise ValueError("espacamento e bleed nao podem ser negativos")
+    if 2 * profile["bleed_cm"] >= min(profile["width_cm"], profile["length_cm"]):
+        raise ValueError("bleed maior que a folha")
+    return profile
+
+
+def _from_file() -> dict:
+    if not SHEET_PROFILES_FILE:
+        return {}
+    try:
+        with open(SHEET_PROFILES_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Perfis de folha em {SHEET_PROFILES_FILE} ignorados: {e}")
+        return {}
+
+
+def _from_db() -> dict:
+    try:
+        rows = supabase.table("sheet_profiles").select("*").eq("active", True).execute().data or []
+    except Exception as e:
+        print(f"⚠️ Tabela sheet_profiles indisponivel: {e}")
+        return {}
+    return {r["name"]: r for r in rows}
+
+
+def _load(include_db: bool = True) -> dict[str, dict]:
+    profiles = {}
+    sources = (BUILTIN_SHEET_PROFILES, _from_file(), _from_db() if include_db else {})
+    for source in sources:
+        for name, raw in source.items():
+            try:
+                profiles[name] = _normalize(name, raw)
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"⚠️ Perfil de folha {name} invalido: {e}")
+    return profiles
+
+
+def sheet_profiles() -> dict[str, dict]:
+    with _lock:
+        if _state["profiles"] is None or time.monotonic() - _state["loaded_at"] >= SHEET_PROFILES_TTL_SECONDS:
+            _state["profiles"] = _load()
+            _state["loaded_at"] = time.monotonic()
+        return _state["profiles"]
+
+
+def local_sheet_profiles() -> dict[str, dict]:
+    """
+    So embutidos + arquivo, sem a tabela e sem cache: para o worker antes
+    do fork, que nao pode abrir conexao herdada pelos filhos.
+    """
+    return _load(include_db=False)
+
+
+def resolve_sheet_profile(name: str | None) -> dict:
+    name = name or DEFAULT_SHEET_PROFILE
+    profile = sheet_profiles().get(name)
+    if not profile:
+        raise ValueError(f"Tamanho de folha inválido: {name}")
+    return dict(profile)
+
+
+def job_sheet_profile(payload: dict) -> dict:
+    """Perfil congelado no job; jobs anteriores ao registro resolvem pelo nome."""
+    if payload.get("sheet_profile"):
+        return payload["sheet_profile"]
+    try:
+        return resolve_sheet_profile(payload.get("sheet_size"))
+    except ValueError:
+        return resolve_sheet_profile(DEFAULT_SHEET_PROFILE)
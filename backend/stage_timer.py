@@ -0,0 +1,72 @@
+# backend/stage_timer.py
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger("backend.timing")
+
+
+class StageTimer:
+    """
+    Acumula tempo, contagem de itens e bytes por etapa de um job.
+    Thread-safe: etapas que rodam em paralelo (render por folha) somam o
+    tempo de cada thread; envolva a fase inteira num span proprio para
+    ter tambem o tempo de parede.
+    """
+
+    def __init__(self, job_id: str, **context):
+        self.job_id = job_id
+        self.context = context
+        self.started = time.perf_counter()
+        self._stages: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, ms: float = 0.0, **counts: int):
+        with self._lock:
+            s = self._stages.setdefault(stage, {"ms": 0.0, "count": 0})
+            s["ms"] += ms
+            s["count"] += 1
+            for key, value in counts.items():
+                s[key] = s.get(key, 0) + value
+
+    @contextmanager
+    def span(self, stage: str, **counts: int):
+        """
+        with timer.span("upload", items=1) as c:
+            ...
+            c["bytes"] = len(data)
+        """
+        t0 = time.perf_counter()
+        try:
+            yield counts
+        finally:
+            ms = (time.perf_counter() - t0) * 1000
+            self.add(stage, ms, **counts)
+            # span roda por item (resize/composite): so serializa se o debug estiver ligado
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(json.dumps({
+                    "event": "stage",
+                    "job_id": self.job_id,
+                    "stage": stage,
+                    "ms": round(ms, 1),
+                    **counts,
+                }))
+
+    def summary(self) -> dict:
+        with self._lock:
+            stages = {
+                name: {**s, "ms": round(s["ms"], 1)}
+                for name, s in self._stages.items()
+            }
+        return {
+            **self.context,
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "stages": stages,
+        }
+
+    def log_summary(self) -> dict:
+        summary = self.summary()
+        logger.info(json.dumps({"event": "job_timing", "job_id": self.job_id, **summary}))
+        return summary
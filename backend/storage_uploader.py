@@ -0,0 +1,241 @@
+# backend/storage_uploader.py
+#
+# Uploads para o Supabase Storage (folhas do render, ZIP, upload de arte,
+# ingestao, profiler):
+#   - retry com backoff em falha transitoria (rede, 5xx, 429); todo upload
+#     e upsert, entao repetir e seguro;
+#   - objetos grandes (>= STORAGE_TUS_THRESHOLD_MB) vao por TUS, o upload
+#     resumivel do Storage, em blocos de 6 MB: uma falha no meio retoma do
+#     ultimo bloco aceito em vez de reenviar o arquivo inteiro;
+#   - URL publica montada localmente, sem passar pelo client por arquivo;
+#   - BulkUploader: janela de uploads concorrentes; quem gera os arquivos
+#     segue trabalhando enquanto ate N sobem, e submit() bloqueia quando a
+#     janela enche (memoria limitada).
+#
+# data pode ser bytes, um buffer (memoryview/bytearray, ex.: getbuffer() do
+# encoder; lido sem copia) ou o caminho de um arquivo local (lido em stream).
+
+import io
+import os
+import time
+import base64
+import threading
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor, Future
+
+import httpx
+
+from backend.supabase_client import supabase, SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY
+
+STORAGE_UPLOAD_CONCURRENCY = int(os.getenv("STORAGE_UPLOAD_CONCURRENCY", "8"))
+STORAGE_UPLOAD_RETRIES = int(os.getenv("STORAGE_UPLOAD_RETRIES", "3"))
+STORAGE_RETRY_BASE_SECONDS = float(os.getenv("STORAGE_RETRY_BASE_SECONDS", "0.5"))
+# 0 desliga o TUS
+STORAGE_TUS_THRESHOLD_BYTES = int(float(os.getenv("STORAGE_TUS_THRESHOLD_MB", "6")) * 1024 * 1024)
+TUS_CHUNK_BYTES = 6 * 1024 * 1024  # tamanho de bloco exigido pelo Storage
+
+STORAGE_PUBLIC_URL = f"{SUPABASE_URL}storage/v1/object/public"
+STORAGE_TUS_URL = os.getenv("SUPABASE_STORAGE_TUS_URL", f"{SUPABASE_URL}storage/v1/upload/resumable")
+
+_tus_http: httpx.Client | None = None
+_tus_lock = threading.Lock()
+
+
+def public_url(bucket: str, path: str) -> str:
+    return f"{STORAGE_PUBLIC_URL}/{bucket}/{quote(path)}"
+
+
+def _backoff(attempt: int) -> float:
+    return STORAGE_RETRY_BASE_SECONDS * 2 ** (attempt - 1)
+
+
+def _transient(e: Exception) -> bool:
+    if isinstance(e, httpx.TransportError):
+        return True
+    # StorageApiError (storage3) traz .status; HTTPStatusError (TUS), .response
+    status = getattr(e, "status", None)
+    if status is None and isinstance(e, httpx.HTTPStatusError):
+        status = e.response.status_code
+    try:
+        status = int(status)
+    except (TypeError, ValueError):
+        return False
+    return status == 429 or status >= 500
+
+
+def _size(data) -> int:
+    return len(data) if isinstance(data, (bytes, bytearray, memoryview)) else os.path.getsize(data)
+
+
+def _read_chunk(data, offset: int, n: int) -> bytes:
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return bytes(memoryview(data)[offset:offset + n])
+    with open(data, "rb") as f:
+        f.seek(offset)
+        return f.read(n)
+
+
+class _BufferReader(io.RawIOBase):
+    """Leitura em blocos de um buffer, sem copia-lo inteiro para bytes."""
+
+    def __init__(self, data):
+        self._view = memoryview(data).cast("B")
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def readinto(self, b):
+        n = max(0, min(len(b), len(self._view) - self._pos))
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+
+def _upload_simple(bucket: str, path: str, data, content_type: str):
+    options = {"content-type": content_type, "upsert": "true"}
+    bucket_api = supabase.storage.from_(bucket)
+    # o storage3 so aceita bytes ou arquivo binario; qualquer outra coisa
+    # vira caminho. Cada tentativa abre um leitor novo (posicao 0).
+    if isinstance(data, bytes):
+        bucket_api.upload(path, data, options)
+    elif isinstance(data, (bytearray, memoryview)):
+        with io.BufferedReader(_BufferReader(data)) as f:
+            bucket_api.upload(path, f, options)
+    else:
+        with open(data, "rb") as f:
+            bucket_api.upload(path, f, options)
+
+
+# =========================
+# TUS
+# =========================
+
+def _tus_client() -> httpx.Client:
+    global _tus_http
+    with _tus_lock:
+        if _tus_http is None:
+            _tus_http = httpx.Client(
+                timeout=httpx.Timeout(60.0),
+                limits=httpx.Limits(max_connections=STORAGE_UPLOAD_CONCURRENCY),
+                headers={
+                    "authorization": f"Bearer {SUPABASE_SERVICE_ROLE_KEY}",
+                    "apikey": SUPABASE_SERVICE_ROLE_KEY,
+                    "tus-resumable": "1.0.0",
+                },
+            )
+        return _tus_http
+
+
+def _tus_metadata(**fields: str) -> str:
+    return ",".join(f"{k} {base64.b64encode(v.encode()).decode()}" for k, v in fields.items())
+
+
+def _upload_tus(bucket: str, path: str, data, content_type: str, size: int):
+    http = _tus_client()
+    created = http.post(STORAGE_TUS_URL, headers={
+        "upload-length": str(size),
+        "upload-metadata": _tus_metadata(bucketName=bucket, objectName=path, contentType=content_type),
+        "x-upsert": "true",
+    })
+    created.raise_for_status()
+    location = str(httpx.URL(STORAGE_TUS_URL).join(created.headers["location"]))
+
+    offset, failures = 0, 0
+    while offset < size:
+        try:
+            r = http.patch(
+                location,
+                content=_read_chunk(data, offset, TUS_CHUNK_BYTES),
+                headers={"upload-offset": str(offset), "content-type": "application/offset+octet-stream"},
+            )
+            r.raise_for_status()
+            offset = int(r.headers["upload-offset"])
+            failures = 0
+        except Exception as e:
+            failures += 1
+            if not _transient(e) or failures > STORAGE_UPLOAD_RETRIES:
+                raise
+            time.sleep(_backoff(failures))
+            # retoma do ponto que o servidor confirmou
+            head = http.head(location)
+            head.raise_for_status()
+            offset = int(head.headers["upload-offset"])
+
+
+# =========================
+# UPLOAD
+# =========================
+
+def upload(bucket: str, path: str, data, content_type: str = "application/octet-stream") -> str:
+    """Sobe (upsert) e retorna a URL publica."""
+    size = _size(data)
+    resumable = bool(STORAGE_TUS_THRESHOLD_BYTES) and size >= STORAGE_TUS_THRESHOLD_BYTES
+
+    for attempt in range(1, STORAGE_UPLOAD_RETRIES + 2):
+        try:
+            if resumable:
+                _upload_tus(bucket, path, data, content_type, size)
+            else:
+                _upload_simple(bucket, path, data, content_type)
+            break
+        except Exception as e:
+            if not _transient(e) or attempt > STORAGE_UPLOAD_RETRIES:
+                raise
+            delay = _backoff(attempt)
+            print(f"🔁 Upload {bucket}/{path} falhou ({e}), tentativa {attempt + 1} em {delay:.1f}s")
+            time.sleep(delay)
+
+    return public_url(bucket, path)
+
+
+class BulkUploader:
+    """
+    Janela de uploads concorrentes. submit() aceita qualquer funcao (ex.:
+    upload + registro da folha) e bloqueia enquanto houver `concurrency`
+    em andamento.
+    """
+
+    def __init__(self, concurrency: int = STORAGE_UPLOAD_CONCURRENCY):
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="upload")
+        self._window = threading.BoundedSemaphore(concurrency)
+        self._futures: list[Future] = []
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        self._window.acquire()
+        try:
+            future = self._pool.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._window.release()
+            raise
+        future.add_done_callback(lambda _: self._window.release())
+        self._futures.append(future)
+        return future
+
+    def upload(self, bucket: str, path: str, data, content_type: str = "application/octet-stream") -> Future:
+        return self.submit(upload, bucket, path, data, content_type)
+
+    def wait(self) -> list:
+        """Espera tudo o que foi submetido; a primeira falha e relancada."""
+        futures, self._futures = self._futures, []
+        return [f.result() for f in futures]
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
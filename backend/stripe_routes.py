@@ -1,7 +1,6 @@
 # backend/stripe_routes.py
 
 import os
-import stripe
 from datetime import datetime
 from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import JSONResponse
@@ -18,7 +17,12 @@ STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
 if not STRIPE_SECRET_KEY or not STRIPE_WEBHOOK_SECRET:
     raise RuntimeError("Stripe env vars não configuradas")
 
-stripe.api_key = STRIPE_SECRET_KEY
+def _stripe():
+    # SDK carregado na primeira chamada de uma rota /stripe, nao no boot da API
+    import stripe
+
+    stripe.api_key = STRIPE_SECRET_KEY
+    return stripe
 
 # ======================================================
 # ROUTER
@@ -99,7 +103,7 @@ async def create_checkout(payload: dict):
         raise HTTPException(400, "Plano inválido")
 
     try:
-        session = stripe.checkout.Session.create(
+        session = _stripe().checkout.Session.create(
             mode="subscription",
             payment_method_types=["card"],
             customer_email=payload["email"],
@@ -137,7 +141,7 @@ async def customer_portal(payload: dict):
     """
 
     try:
-        portal = stripe.billing_portal.Session.create(
+        portal = _stripe().billing_portal.Session.create(
             customer=payload["customer_id"],
             return_url=payload["return_url"],
         )
@@ -153,6 +157,7 @@ async def customer_portal(payload: dict):
 async def stripe_webhook(request: Request):
     payload = await request.body()
     sig = request.headers.get("stripe-signature")
+    stripe = _stripe()
 
     try:
         event = stripe.Webhook.construct_event(
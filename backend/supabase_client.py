@@ -1,5 +1,6 @@
 import os
-from supabase import create_client, Client
+import httpx
+from supabase import create_client, acreate_client, Client, AsyncClient, AsyncClientOptions
 from dotenv import load_dotenv
 
 if os.getenv("ENV") != "production":
@@ -19,3 +20,44 @@ if not SUPABASE_SERVICE_ROLE_KEY:
     raise RuntimeError("SUPABASE_SERVICE_ROLE_KEY não configurada (NÃO use anon key no backend)")
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+
+# =========================
+# ASYNC (API)
+# =========================
+# Um unico AsyncClient por processo, com pool de conexoes compartilhado
+# entre PostgREST e Storage; criado no startup do FastAPI.
+
+SUPABASE_POOL_SIZE = int(os.getenv("SUPABASE_POOL_SIZE", "50"))
+
+_async_http: httpx.AsyncClient | None = None
+_async_supabase: AsyncClient | None = None
+
+
+async def get_async_supabase() -> AsyncClient:
+    global _async_http, _async_supabase
+
+    if _async_supabase is None:
+        _async_http = httpx.AsyncClient(
+            timeout=httpx.Timeout(30.0),
+            limits=httpx.Limits(
+                max_connections=SUPABASE_POOL_SIZE,
+                max_keepalive_connections=SUPABASE_POOL_SIZE,
+            ),
+        )
+        _async_supabase = await acreate_client(
+            SUPABASE_URL,
+            SUPABASE_SERVICE_ROLE_KEY,
+            AsyncClientOptions(httpx_client=_async_http),
+        )
+
+    return _async_supabase
+
+
+async def close_async_supabase():
+    global _async_http, _async_supabase
+
+    if _async_http is not None:
+        await _async_http.aclose()
+
+    _async_http = None
+    _async_supabase = None
@@ -0,0 +1,45 @@
+from backend.packing import Sheet, count_sheets, pack_pieces, used_length
+from backend.print_utils import cm_to_px
+
+PROFILE = {"width_cm": 30, "length_cm": 100, "dpi": 300, "spacing_cm": 0.2, "bleed_cm": 0}
+
+
+def piece(width, height):
+    return {"url": f"https://cdn/{width}x{height}.png", "width": width, "height": height}
+
+
+def test_pack_pieces_offsets_items_by_bleed():
+    bleed_cm = 1
+    sheets, sheet_w, sheet_h = pack_pieces([piece(10, 10)], {**PROFILE, "bleed_cm": bleed_cm})
+    item = sheets[0].items[0]
+    assert (sheet_w, sheet_h) == (cm_to_px(30), cm_to_px(100))
+    assert (item["x"], item["y"]) == (cm_to_px(bleed_cm), cm_to_px(bleed_cm))
+
+
+def test_pack_pieces_uses_profile_dpi():
+    sheets, sheet_w, _ = pack_pieces([piece(10, 10)], {**PROFILE, "dpi": 150})
+    assert sheet_w == cm_to_px(30, 150)
+    assert sheets[0].items[0]["w"] == cm_to_px(10, 150)
+
+
+def test_count_sheets():
+    assert count_sheets([piece(28, 90)] * 3, PROFILE) == 3
+    assert count_sheets([piece(10, 10)] * 3, PROFILE) == 1
+
+
+def test_used_length_with_bleed_stops_after_lowest_piece():
+    bleed = cm_to_px(1)
+    sheets, _, sheet_h = pack_pieces([piece(10, 20)], {**PROFILE, "bleed_cm": 1})
+    assert used_length(sheets[0], sheet_h, bleed) == bleed + cm_to_px(20) + bleed
+
+
+def test_used_length_counts_rotated_height():
+    sheet = Sheet()
+    sheet.items = [{"x": 0, "y": 10, "w": 300, "h": 50, "rotated": True}]
+    assert used_length(sheet, 10_000, 5) == 10 + 300 + 5
+
+
+def test_used_length_is_capped_at_sheet_length():
+    sheet = Sheet()
+    sheet.items = [{"x": 0, "y": 900, "w": 50, "h": 100}]
+    assert used_length(sheet, 1000, 30) == 1000
@@ -0,0 +1,72 @@
+import pytest
+from fastapi import HTTPException
+
+from backend.pagination import decode_cursor, encode_cursor, keyset_page, split_page
+
+ROW = {"created_at": "2026-10-19T12:00:00.123456+00:00", "id": "5f0c6b2e-8a51-4b0e-9a55-2f6c3c1d9e10"}
+
+
+class FakeQuery:
+    """Registra as chamadas do query builder do PostgREST."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+        return call
+
+
+def rows(n):
+    return [{"created_at": f"2026-10-19T12:00:{i:02d}+00:00", "id": f"00000000-0000-0000-0000-{i:012d}"} for i in range(n)]
+
+
+def test_cursor_roundtrip():
+    cursor = encode_cursor(ROW)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (ROW["created_at"], ROW["id"])
+
+
+@pytest.mark.parametrize("cursor", [
+    "nao-e-base64!",
+    encode_cursor({"created_at": "ontem", "id": ROW["id"]}),
+    encode_cursor({"created_at": ROW["created_at"], "id": "1) or (1=1"}),
+])
+def test_invalid_cursor_is_400(cursor):
+    with pytest.raises(HTTPException) as e:
+        decode_cursor(cursor)
+    assert e.value.status_code == 400
+
+
+def test_first_page_orders_by_created_at_then_id():
+    q = keyset_page(FakeQuery(), None, 10)
+    assert q.calls == [
+        ("order", ("created_at",), {"desc": True}),
+        ("order", ("id",), {"desc": True}),
+        ("limit", (11,), {}),
+    ]
+
+
+def test_next_page_breaks_ties_on_id():
+    q = keyset_page(FakeQuery(), encode_cursor(ROW), 10)
+    name, (flt,), _ = q.calls[0]
+    assert name == "or_"
+    assert flt == (
+        f'created_at.lt."{ROW["created_at"]}",'
+        f'and(created_at.eq."{ROW["created_at"]}",id.lt."{ROW["id"]}")'
+    )
+
+
+def test_split_page_last_page_has_no_cursor():
+    page, cursor = split_page(rows(10), 10)
+    assert len(page) == 10
+    assert cursor is None
+
+
+def test_split_page_cursor_points_at_last_returned_row():
+    data = rows(11)
+    page, cursor = split_page(data, 10)
+    assert page == data[:10]
+    assert decode_cursor(cursor) == (data[9]["created_at"], data[9]["id"])
@@ -0,0 +1,34 @@
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from backend import png_encoder
+from backend.benchmarks.encode import PILLOW, measure
+
+
+@pytest.mark.parametrize("strategy", ["none", "sub", "up"])
+def test_parallel_encoder_roundtrip(strategy):
+    # altura fora do multiplo da faixa: a ultima faixa e parcial
+    w, h = 123, png_encoder.ROWS_PER_BLOCK * 2 + 89
+    img = Image.frombytes("RGBA", (w, h), os.urandom(w * h * 4))
+    out = io.BytesIO()
+    png_encoder._encode_parallel(img, out, 6, strategy, 300)
+
+    decoded = Image.open(io.BytesIO(out.getvalue()))
+    assert decoded.size == img.size
+    assert decoded.tobytes() == img.tobytes()
+    assert round(decoded.info["dpi"][0]) == 300
+
+
+@pytest.mark.parametrize("profile", ["fast", "balanced"])
+def test_encode_peak_rss_close_to_pillow(profile):
+    # Pico de RSS da chamada inteira, num processo novo; duas threads para
+    # exercitar o encoder paralelo mesmo numa maquina de uma CPU. Uma copia
+    # da folha inteira (filtrada ou em bytes) ja passa do limite.
+    env = {"PNG_ENCODE_THREADS": "2"}
+    pillow = measure(10, 40, PILLOW, env)
+    ours = measure(10, 40, profile, env)
+
+    assert ours["rss_mb"] <= pillow["rss_mb"] + 0.5 * ours["sheet_mb"]
@@ -0,0 +1,40 @@
+import pytest
+
+from backend.render_cache import sheet_cache_key
+
+PLACEMENTS = [
+    {"print_url": "https://cdn/a.png", "w": 100, "h": 200, "x": 0, "y": 0, "rotated": False},
+    {"print_url": "https://cdn/b.png", "w": 50, "h": 60, "x": 110, "y": 0, "rotated": True},
+]
+HASHES = {"https://cdn/a.png": "hash-a", "https://cdn/b.png": "hash-b"}
+ARGS = dict(sheet_w=3543, sheet_h=11811, dpi=300, placements=PLACEMENTS, art_hashes=HASHES, preview=False, png_profile="balanced")
+
+
+def key(**overrides):
+    return sheet_cache_key(**{**ARGS, **overrides})
+
+
+def test_key_is_deterministic():
+    assert key() == key()
+    assert len(key()) == 64
+
+
+def test_key_ignores_url_when_content_is_the_same():
+    moved = [{**p, "print_url": p["print_url"].replace("cdn", "cdn2")} for p in PLACEMENTS]
+    hashes = {u.replace("cdn", "cdn2"): h for u, h in HASHES.items()}
+    assert key(placements=moved, art_hashes=hashes) == key()
+
+
+@pytest.mark.parametrize("overrides", [
+    {"sheet_w": 3544},
+    {"sheet_h": 5000},
+    {"dpi": 150},
+    {"preview": True},
+    {"png_profile": "fast"},
+    {"art_hashes": {**HASHES, "https://cdn/a.png": "hash-a2"}},
+    {"placements": [{**PLACEMENTS[0], "x": 1}, PLACEMENTS[1]]},
+    {"placements": [PLACEMENTS[0], {**PLACEMENTS[1], "rotated": False}]},
+    {"placements": list(reversed(PLACEMENTS))},
+])
+def test_key_changes_with_output_inputs(overrides):
+    assert key(**overrides) != key()
@@ -0,0 +1,217 @@
+# backend/upload_utils.py
+import io
+import os
+import tempfile
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(300 * 1024 * 1024)))
+UPLOAD_MAX_SIDE_PX = int(os.getenv("UPLOAD_MAX_SIDE_PX", "20000"))
+UPLOAD_HEADER_BYTES = 64 * 1024
+# JPEG com ICC/EXIF/XMP grandes empurra o SOF para longe do inicio: a janela
+# do cabecalho cresce ate este teto antes de recusar
+UPLOAD_HEADER_MAX_BYTES = int(os.getenv("UPLOAD_HEADER_MAX_BYTES", str(8 * 1024 * 1024)))
+
+UPLOAD_MIME_TYPES = {"PNG": "image/png", "JPEG": "image/jpeg", "WEBP": "image/webp"}
+ALLOWED_FORMATS = set(UPLOAD_MIME_TYPES)
+
+
+class UploadRejected(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class HeaderIncomplete(Exception):
+    """O cabecalho continua alem dos bytes lidos: ler uma janela maior."""
+
+
+def probe_image_header(head: bytes, complete: bool = False) -> tuple[str, int, int]:
+    """
+    Le formato e dimensoes so pelo cabecalho (Image.open nao decodifica
+    os pixels), recusando o arquivo antes de qualquer trabalho pesado.
+    complete indica que head e o arquivo inteiro; senao um cabecalho
+    truncado levanta HeaderIncomplete em vez de recusar.
+    """
+    # Pillow so no primeiro upload, fora do import da API
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        with Image.open(io.BytesIO(head)) as img:
+            fmt, (w, h) = img.format, img.size
+    except UnidentifiedImageError:
+        raise UploadRejected(400, "Arquivo não é uma imagem válida")
+    except Exception:
+        # "Truncated File Read" e afins: o cabecalho nao terminou na janela
+        if complete or len(head) >= UPLOAD_HEADER_MAX_BYTES:
+            raise UploadRejected(400, "Arquivo não é uma imagem válida")
+        raise HeaderIncomplete()
+
+    if fmt not in ALLOWED_FORMATS:
+        raise UploadRejected(415, f"Formato não suportado: {fmt}")
+
+    if w > UPLOAD_MAX_SIDE_PX or h > UPLOAD_MAX_SIDE_PX:
+        raise UploadRejected(413, f"Imagem grande demais: {w}x{h}px")
+
+    return fmt, w, h
+
+
+def probe_image_range(read_head) -> tuple[str, int, int]:
+    """
+    probe_image_header sobre read_head(n), que devolve os primeiros n bytes
+    (menos no fim do arquivo), dobrando a janela enquanto o cabecalho nao
+    couber.
+    """
+    window = UPLOAD_HEADER_BYTES
+    while True:
+        head = read_head(window)
+        try:
+            return probe_image_header(head, complete=len(head) < window)
+        except HeaderIncomplete:
+            window = min(window * 2, UPLOAD_HEADER_MAX_BYTES)
+
+
+# extensao do arquivo no storage por formato detectado
+UPLOAD_EXTENSIONS = {"PNG": "png", "JPEG": "jpg", "WEBP": "webp"}
+UPLOAD_FIELD_MAX_BYTES = 1024
+# folga para os campos de texto e o enquadramento do multipart
+UPLOAD_FORM_OVERHEAD_BYTES = 64 * 1024
+
+
+class _FilePart:
+    """
+    Parte "file" do multipart gravada direto em disco: acumula so o
+    cabecalho da imagem, valida no primeiro bloco e corta no limite.
+    """
+
+    def __init__(self):
+        fd, self.path = tempfile.mkstemp(suffix=".upload")
+        self.out = os.fdopen(fd, "wb")
+        self.size = 0
+        self.head = b""
+        self.window = UPLOAD_HEADER_BYTES
+        self.header = None
+
+    def write(self, data: bytes):
+        self.size += len(data)
+        if self.size > UPLOAD_MAX_BYTES:
+            raise UploadRejected(413, f"Arquivo excede {UPLOAD_MAX_BYTES // (1024 * 1024)} MB")
+
+        if self.header is None:
+            self.head += data
+            if len(self.head) >= self.window:
+                self.probe()
+            return
+        self.out.write(data)
+
+    def probe(self, complete: bool = False):
+        if self.header is not None or not self.head:
+            return
+        try:
+            self.header = probe_image_header(self.head if complete else self.head[:self.window], complete)
+        except HeaderIncomplete:
+            # cabecalho maior que a janela: continua acumulando
+            self.window = min(self.window * 2, UPLOAD_HEADER_MAX_BYTES)
+            return
+        self.out.write(self.head)
+        self.head = b""
+
+    def discard(self):
+        self.out.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+async def spool_multipart_upload(request, file_field: str = "file") -> tuple[dict, str, int, tuple[str, int, int]]:
+    """
+    Le o corpo multipart em stream (sem o parse do Starlette, que recebe o
+    upload inteiro antes do handler): Content-Length acima do limite e
+    recusado antes de ler, o cabecalho da imagem e validado no primeiro
+    bloco e o tamanho cortado durante a leitura.
+    Retorna (campos de texto, caminho, bytes, (formato, largura, altura));
+    quem chama remove o arquivo.
+    """
+    from python_multipart.multipart import MultipartParser, parse_options_header
+    from python_multipart.exceptions import MultipartParseError
+    from fastapi.concurrency import run_in_threadpool
+
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > UPLOAD_MAX_BYTES + UPLOAD_FORM_OVERHEAD_BYTES:
+        raise UploadRejected(413, f"Arquivo excede {UPLOAD_MAX_BYTES // (1024 * 1024)} MB")
+
+    content_type, params = parse_options_header(request.headers.get("content-type"))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise UploadRejected(400, "Esperado multipart/form-data")
+
+    fields: dict[str, str] = {}
+    state = {"name": None, "filename": None, "header_field": b"", "header_value": b"", "headers": {}, "value": b""}
+    upload: _FilePart | None = None
+
+    def on_header_field(data, start, end):
+        state["header_field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["header_value"] += data[start:end]
+
+    def on_header_end():
+        state["headers"][state["header_field"].lower()] = state["header_value"]
+        state["header_field"], state["header_value"] = b"", b""
+
+    def on_headers_finished():
+        nonlocal upload
+        _, disposition = parse_options_header(state["headers"].get(b"content-disposition"))
+        state["name"] = disposition.get(b"name", b"").decode("latin-1")
+        state["filename"] = disposition.get(b"filename")
+        if state["name"] == file_field and state["filename"] is not None:
+            if upload is not None:
+                raise UploadRejected(400, "Envie um arquivo por vez")
+            upload = _FilePart()
+
+    def on_part_data(data, start, end):
+        if state["name"] == file_field and state["filename"] is not None:
+            upload.write(data[start:end])
+            return
+        state["value"] += data[start:end]
+        if len(state["value"]) > UPLOAD_FIELD_MAX_BYTES:
+            raise UploadRejected(413, f"Campo grande demais: {state['name']}")
+
+    def on_part_end():
+        if state["name"] == file_field and state["filename"] is not None:
+            upload.probe(complete=True)
+        elif state["name"]:
+            fields[state["name"]] = state["value"].decode("utf-8", errors="replace")
+        state.update(name=None, filename=None, headers={}, value=b"")
+
+    parser = MultipartParser(params[b"boundary"], {
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    def finish():
+        parser.finalize()
+        if upload is not None:
+            upload.out.close()
+
+    try:
+        # parse e escrita em disco no threadpool: o event loop so recebe
+        # os blocos e segue atendendo os outros requests
+        async for chunk in request.stream():
+            await run_in_threadpool(parser.write, chunk)
+        await run_in_threadpool(finish)
+    except BaseException as e:
+        if upload is not None:
+            upload.discard()
+        if isinstance(e, MultipartParseError):
+            raise UploadRejected(400, "Corpo multipart inválido")
+        raise
+
+    if upload is None or upload.header is None:
+        if upload is not None:
+            upload.discard()
+        raise UploadRejected(400, "Arquivo vazio")
+
+    return fields, upload.path, upload.size, upload.header
@@ -1,8 +1,26 @@
+# backend/worker.py
+#
+# WORKER_MODE=fork (padrao): Worker do RQ, um work-horse (fork) por job;
+#   o que o job aprende (artes decodificadas, conexoes) morre com ele.
+# WORKER_MODE=simple: processo de longa duracao que roda os jobs no
+#   proprio processo (SimpleWorker), entao cache de artes, pools HTTP e
+#   marca d'agua ficam quentes entre jobs. Guardas de memoria: o processo
+#   se recicla depois de WORKER_MAX_JOBS jobs ou quando o RSS passa de
+#   WORKER_MAX_RSS_MB; o supervisor (este processo, ja pre-carregado) cria
+#   outro por fork.
+#
+#   python -m backend.worker
+
 import logging
 import os
-from rq import Worker, Connection
+import time
+import signal
+import resource
+from rq import Worker, SimpleWorker
 from redis import Redis
 from backend.job_queue import queue
+from backend.supabase_client import supabase
+from backend.metrics import instrument_supabase, start_worker_metrics_server
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -12,16 +30,122 @@ REDIS_URL = os.getenv("REDIS_URL")
 if not REDIS_URL:
     raise RuntimeError("REDIS_URL não configurada")
 
-if __name__ == "__main__":
+WORKER_MODE = os.getenv("WORKER_MODE", "fork")
+WORKER_MAX_JOBS = int(os.getenv("WORKER_MAX_JOBS", "200"))
+WORKER_MAX_RSS_MB = int(os.getenv("WORKER_MAX_RSS_MB", "3072"))
+WORKER_TTL_SECONDS = 300
+
+
+def preload():
+    """
+    O RQ roda cada job num work-horse criado por fork deste processo: o que
+    for carregado aqui (render engine, Pillow e seus plugins, perfis de
+    folha, marca d'agua) o job herda pronto, sem reimportar nem remontar.
+    Sem threads/pools e sem rede aqui: threads nao sobrevivem ao fork, e
+    uma conexao aberta (o PostgREST do supabase e HTTP/2) seria
+    compartilhada por todos os filhos. Por isso so os perfis locais.
+    """
+    t0 = time.perf_counter()
+
+    from PIL import Image
+    from backend import jobs, artwork_ingest, png_encoder  # noqa: F401
+    from backend.render_engine import warm_caches
+    from backend.sheet_profiles import local_sheet_profiles
+
+    Image.init()
+    warm_caches(local_sheet_profiles().values())
+
+    logger.info(f"🔥 Worker pre-carregado em {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+
+def current_rss_mb() -> float:
+    """RSS atual (nao o pico): /proc no Linux, ru_maxrss como aproximacao fora dele."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class RecyclingWorker(SimpleWorker):
+    """SimpleWorker que para (para ser reciclado) quando o RSS passa do limite."""
+
+    def execute_job(self, job, queue):
+        super().execute_job(job, queue)
+
+        rss = current_rss_mb()
+        if rss > WORKER_MAX_RSS_MB:
+            self.log.info(f"♻️ Worker {self.name}: RSS {rss:.0f} MB > {WORKER_MAX_RSS_MB} MB, reciclando")
+            self._stop_requested = True
+
+
+def run_worker(worker_class):
+    # conexao propria: no modo simple cada processo reciclado abre a sua
     redis_conn = Redis.from_url(REDIS_URL, decode_responses=False)
+    worker = worker_class([queue], connection=redis_conn, worker_ttl=WORKER_TTL_SECONDS)
+
+    logger.info(f"🚀 {worker_class.__name__} {worker.name} iniciado e aguardando jobs...")
+    # scheduler: retries com intervalo e re-enqueue do reaper (enqueue_in)
+    worker.work(
+        burst=False,
+        logging_level=logging.INFO,
+        with_scheduler=True,
+        max_jobs=WORKER_MAX_JOBS if worker_class is RecyclingWorker else None,
+    )
+
+
+def supervise():
+    """
+    Modo simple: mantem um processo de trabalho vivo, recriando-o (fork do
+    supervisor ja pre-carregado) sempre que ele sai para se reciclar.
+    SIGTERM/SIGINT sao repassados ao filho (warm shutdown do RQ).
+    """
+    state = {"stopping": False, "child": None}
+
+    def forward(signum, frame):
+        state["stopping"] = True
+        if state["child"]:
+            os.kill(state["child"], signum)
 
-    with Connection(redis_conn):
-        worker = Worker(
-            [queue],
-            connection=redis_conn,
-            default_worker_ttl=300,
-            job_timeout=600
-        )
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+
+    while not state["stopping"]:
+        started = time.monotonic()
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 0
+            try:
+                run_worker(RecyclingWorker)
+            except BaseException:
+                logger.exception("Worker encerrado com erro")
+                code = 1
+            os._exit(code)
+
+        state["child"] = pid
+        if state["stopping"]:
+            # sinal chegou entre o fork e o registro do filho
+            os.kill(pid, signal.SIGTERM)
+        _, status = os.waitpid(pid, 0)
+        state["child"] = None
+
+        code = os.waitstatus_to_exitcode(status)
+        if state["stopping"]:
+            break
+        logger.info(f"♻️ Processo de trabalho {pid} saiu (codigo {code}), iniciando outro")
+        # filho que morre logo ao subir (Redis fora, etc.) nao vira loop quente
+        if code != 0 and time.monotonic() - started < 10:
+            time.sleep(5)
+
+
+if __name__ == "__main__":
+    instrument_supabase(supabase)
+    preload()
+    start_worker_metrics_server([queue])
 
-        logger.info("🚀 Worker iniciado e aguardando jobs...")
-        worker.work(burst=False, logging_level=logging.INFO)
+    if WORKER_MODE == "simple":
+        supervise()
+    else:
+        run_worker(Worker)
@@ -0,0 +1,11 @@
+# conftest.py
+#
+# Raiz do repo no sys.path para os testes importarem "backend.*", e as
+# variaveis que supabase_client exige (nenhum teste fala com o Supabase).
+
+import os
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9/")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test")
+os.environ.setdefault("SUPABASE_JWT_SECRET", "test")
+os.environ.setdefault("ENV", "production")
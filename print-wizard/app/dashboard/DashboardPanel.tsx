@@ -13,21 +13,30 @@ type Usage = {
   remaining_days: number
 }
 
+type SheetProfile = {
+  name: string
+  label: string
+}
+
 export default function DashboardPanel({
   sheetSize,
   setSheetSize,
 }: {
-  sheetSize: '30x100' | '57x100'
-  setSheetSize: (v: '30x100' | '57x100') => void
+  sheetSize: string
+  setSheetSize: (v: string) => void
 }) {
   const { session } = useSession()
   const router = useRouter()
 
   const [usage, setUsage] = useState<Usage | null>(null)
   const [loading, setLoading] = useState(true)
+  const [sheetProfiles, setSheetProfiles] = useState<SheetProfile[]>([
+    { name: '30x100', label: '30x100' },
+    { name: '57x100', label: '57x100' },
+  ])
 
   useEffect(() => {
-    const ss = localStorage.getItem('sheet_size') as '30x100' | '57x100'
+    const ss = localStorage.getItem('sheet_size')
     if (ss) setSheetSize(ss)
   }, [setSheetSize])
 
@@ -53,6 +62,12 @@ export default function DashboardPanel({
 
     loadUsage()
 
+    request<SheetProfile[]>('/sheet-profiles')
+      .then((data) => {
+        if (!cancelled && data.length) setSheetProfiles(data)
+      })
+      .catch((err) => console.error('Erro ao carregar tamanhos de folha', err))
+
     return () => {
       cancelled = true
     }
@@ -145,23 +160,16 @@ export default function DashboardPanel({
           <div className="flex flex-col gap-1">
             <span className="text-gray-500">Folha</span>
 
-            <label>
-              <input
-                type="radio"
-                checked={sheetSize === '30x100'}
-                onChange={() => setSheetSize('30x100')}
-              />{' '}
-              30x100
-            </label>
-
-            <label>
-              <input
-                type="radio"
-                checked={sheetSize === '57x100'}
-                onChange={() => setSheetSize('57x100')}
-              />{' '}
-              57x100
-            </label>
+            {sheetProfiles.map((profile) => (
+              <label key={profile.name}>
+                <input
+                  type="radio"
+                  checked={sheetSize === profile.name}
+                  onChange={() => setSheetSize(profile.name)}
+                />{' '}
+                {profile.label}
+              </label>
+            ))}
           </div>
         </div>
       </div>
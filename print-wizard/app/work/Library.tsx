@@ -1,7 +1,7 @@
 'use client'
 
 import { useEffect, useMemo, useRef, useState, useCallback } from 'react'
-import { request } from '@/lib/apiClient'
+import { request, requestPage } from '@/lib/apiClient'
 import { Pencil, StickyNote } from 'lucide-react'
 import EditPrintModal from '@/components/EditPrintModal'
 
@@ -40,6 +40,8 @@ export default function Library({ onPreview, version }: Props) {
   const [prints, setPrints] = useState<Print[]>([])
   const [search, setSearch] = useState('')
   const [loading, setLoading] = useState(true)
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [usage, setUsage] = useState<UsageLocal | null>(null)
 
   const [notes, setNotes] = useState<Record<string, string>>({})
@@ -62,12 +64,13 @@ export default function Library({ onPreview, version }: Props) {
     try {
       setLoading(true)
       const [printsData, notesData, usageData] = await Promise.all([
-        request<Print[]>('/prints'),
+        requestPage<Print>('/prints'),
         request<any[]>('/print-notes'),
         request<UsageLocal>('/me/usage'),
       ])
 
-      setPrints(printsData)
+      setPrints(printsData.items)
+      setNextCursor(printsData.nextCursor)
       setUsage(usageData)
 
       const map: Record<string, string> = {}
@@ -87,6 +90,25 @@ export default function Library({ onPreview, version }: Props) {
     load()
   }, [version, load])
 
+  // Próxima página só quando pedida: a biblioteca não baixa o catálogo inteiro
+  async function loadMore() {
+    if (!nextCursor || loadingMore) return
+    try {
+      setLoadingMore(true)
+      const page = await requestPage<Print>('/prints', nextCursor)
+      setPrints(current => {
+        const seen = new Set(current.map(p => p.id))
+        return [...current, ...page.items.filter(p => !seen.has(p.id))]
+      })
+      setNextCursor(page.nextCursor)
+    } catch (err) {
+      console.error('Erro ao carregar mais estampas', err)
+      alert('Erro ao carregar mais estampas. Veja o console.')
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   useEffect(() => {
     function handleClickOutside(e: MouseEvent) {
       if (noteRef.current && !noteRef.current.contains(e.target as Node)) {
@@ -198,7 +220,7 @@ export default function Library({ onPreview, version }: Props) {
       <div className="flex justify-between items-center">
         <h2 className="font-semibold text-lg">Biblioteca</h2>
         <span className={`text-sm ${counterColor}`} title={tooltip}>
-          {used} / {limit}
+          {used}{nextCursor ? '+' : ''} / {limit}
         </span>
       </div>
 
@@ -309,6 +331,17 @@ export default function Library({ onPreview, version }: Props) {
               </div>
             )
           })}
+
+        {!loading && nextCursor && (
+          <button
+            type="button"
+            onClick={loadMore}
+            disabled={loadingMore}
+            className="text-xs text-gray-500 hover:text-black py-2 disabled:opacity-50"
+          >
+            {loadingMore ? 'Carregando...' : 'Carregar mais'}
+          </button>
+        )}
       </div>
 
       <div className="mt-auto flex flex-col items-center gap-1">
@@ -20,7 +20,7 @@ export default function WorkPage() {
   const [selectedJob, setSelectedJob] = useState<string | null>(null)
   const [previewItems, setPreviewItems] = useState<PreviewItem[] | null>(null)
   const [libraryVersion, setLibraryVersion] = useState(0)
-  const [sheetSize, setSheetSize] = useState<'30x100' | '57x100'>('30x100')
+  const [sheetSize, setSheetSize] = useState<string>('30x100')
 
   useEffect(() => {
     if (!loading && !session) {
@@ -9,6 +9,7 @@ type Slot = {
   width_cm: number
   height_cm: number
   url?: string
+  preview_url?: string
 }
 
 type Print = {
@@ -117,7 +118,7 @@ export default function EditPrintModal({
             >
               {slot.url && (
                 <img
-                  src={slot.url}
+                  src={slot.preview_url ?? slot.url}
                   className="w-20 h-20 object-contain border rounded"
                 />
               )}
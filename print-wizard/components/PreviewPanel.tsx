@@ -30,7 +30,7 @@ type GeneratedFile = {
 }
 
 type PreviewProps = {
-  sheetSize: '30x100' | '57x100'
+  sheetSize: string
   items: PreviewItem[]
   onJobCreated: (jobId: string) => void
   onReset: () => void
@@ -17,10 +17,7 @@ async function getAuthHeader(): Promise<AuthHeader> {
   }
 }
 
-export async function request<T>(
-  path: string,
-  options: RequestOptions = {}
-): Promise<T> {
+async function send(path: string, options: RequestOptions = {}): Promise<Response> {
   const { auth = true, headers, ...rest } = options
 
   const authHeader = auth ? await getAuthHeader() : {}
@@ -39,5 +36,34 @@ export async function request<T>(
     throw new Error(text || 'Erro na requisição')
   }
 
+  return res
+}
+
+export async function request<T>(
+  path: string,
+  options: RequestOptions = {}
+): Promise<T> {
+  const res = await send(path, options)
   return res.json()
 }
+
+export type Page<T> = {
+  items: T[]
+  nextCursor: string | null
+}
+
+// Listas paginadas por cursor: uma página por chamada; o cursor da próxima
+// vem no header X-Next-Cursor (null na última)
+export async function requestPage<T>(
+  path: string,
+  cursor: string | null = null,
+  options: RequestOptions = {}
+): Promise<Page<T>> {
+  const sep = path.includes('?') ? '&' : '?'
+  const url = cursor ? `${path}${sep}cursor=${encodeURIComponent(cursor)}` : path
+  const res = await send(url, options)
+  return {
+    items: (await res.json()) as T[],
+    nextCursor: res.headers.get('X-Next-Cursor'),
+  }
+}
@@ -0,0 +1,8 @@
+-- Metadados da normalizacao de arte feita no upload (backend/artwork_ingest.py)
+alter table public.print_slots
+  add column if not exists original_url text,
+  add column if not exists preview_url text,
+  add column if not exists pixel_width integer,
+  add column if not exists pixel_height integer,
+  add column if not exists content_hash text,
+  add column if not exists trimmed boolean not null default false;
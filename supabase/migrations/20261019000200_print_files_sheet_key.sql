@@ -0,0 +1,7 @@
+-- Checkpoint por folha (backend/jobs.py): a chave do cache da folha permite
+-- retomar um job reaproveitando so as folhas que continuam iguais
+alter table public.print_files
+  add column if not exists sheet_key text;
+
+create index if not exists print_files_job_id_preview_idx
+  on public.print_files (job_id, preview);
@@ -0,0 +1,7 @@
+-- Heartbeat e orcamento de tentativas dos renders (backend/jobs.py, backend/reaper.py)
+alter table public.jobs
+  add column if not exists heartbeat_at timestamptz,
+  add column if not exists attempts integer not null default 0;
+
+create index if not exists jobs_status_heartbeat_idx
+  on public.jobs (status, heartbeat_at);
@@ -0,0 +1,17 @@
+-- Contadores fora do payload (historico nao precisa ler o JSONB com pieces)
+alter table public.jobs
+  add column if not exists kits integer,
+  add column if not exists sheets integer;
+
+update public.jobs
+set
+  kits = nullif(payload->>'kits', '')::integer,
+  sheets = nullif(payload->>'sheets', '')::integer
+where kits is null and sheets is null;
+
+-- Paginacao keyset (created_at desc, id desc) por usuario
+create index if not exists jobs_user_created_id_idx
+  on public.jobs (user_id, created_at desc, id desc);
+
+create index if not exists prints_user_created_id_idx
+  on public.prints (user_id, created_at desc, id desc);
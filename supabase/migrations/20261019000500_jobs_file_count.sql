@@ -0,0 +1,13 @@
+-- Quantidade de print_files do job, gravada pelo worker ao terminar o render
+-- (GET /jobs/{id} e /stats/prints nao contam mais linhas)
+alter table public.jobs
+  add column if not exists file_count integer not null default 0;
+
+update public.jobs j
+set file_count = f.n
+from (
+  select job_id, count(*)::integer as n
+  from public.print_files
+  group by job_id
+) f
+where f.job_id = j.id;
@@ -0,0 +1,8 @@
+-- Gang: pedidos confirmados juntos (POST /print-jobs/gang) apontam para o
+-- job que renderiza as folhas compartilhadas; ficam "ganged" ate ele terminar
+alter table public.jobs
+  add column if not exists gang_id uuid references public.jobs (id) on delete set null;
+
+create index if not exists jobs_gang_id_idx
+  on public.jobs (gang_id)
+  where gang_id is not null;
@@ -0,0 +1,17 @@
+-- Perfis de folha/filme alem dos embutidos (backend/sheet_profiles.py);
+-- name e o valor aceito em sheet_size. Linha com o mesmo nome de um perfil
+-- embutido o substitui.
+create table if not exists public.sheet_profiles (
+  name text primary key,
+  label text,
+  width_cm numeric not null check (width_cm > 0),
+  length_cm numeric not null check (length_cm > 0),
+  roll boolean not null default false,
+  dpi integer check (dpi > 0),
+  spacing_cm numeric check (spacing_cm >= 0),
+  bleed_cm numeric check (bleed_cm >= 0),
+  active boolean not null default true,
+  created_at timestamptz not null default now()
+);
+
+alter table public.sheet_profiles enable row level security;